@@ -88,7 +88,7 @@ def get_quotes_with_fallback():
     # Log current pricing status
     for token in SUPPORTED_TOKENS.keys():
         price = quotes.get(token, 0.0)
-        is_fresh = live_pricing.is_price_fresh(token, 30)
+        is_fresh = live_pricing.is_price_fresh(token)
         status = "LIVE" if is_fresh and price > 0 else "STALE" if price > 0 else "MISSING"
         logging.info(f"📊 {token}: ${price:.6f} ({status})")
     
@@ -201,7 +201,7 @@ def pricing_status():
         # Add freshness info for each token
         token_status = {}
         for token in SUPPORTED_TOKENS.keys():
-            is_fresh = live_pricing.is_price_fresh(token, 30)
+            is_fresh = live_pricing.is_price_fresh(token)
             price = prices.get(token, 0.0)
             token_status[token] = {
                 'price': price,
@@ -295,7 +295,7 @@ def simulate_rebalance():
         # Simulate current holdings (slightly off from target to show rebalance need)
         for token, weight in session['basket'].items():
             target_value = total_value * (weight / 100.0)
-            target_holdings[token] = target_value / quotes[token] if quotes[token] > 0 else 0
+            target_holdings[token] = target_value / quotes[token] if quotes.get(token, 0) > 0 else 0
             
             # Simulate drift: current holdings are +/- 5-10% from target
             drift_factor = random.uniform(0.9, 1.1)  # 10% drift
@@ -953,7 +953,7 @@ def get_quote_latency_health():
     """Get quote call latency metrics - avg/p50/p95 latency, error rates"""
     try:
         try:
-            latency_metrics = jupiter_api._latency_tracker.get_metrics()
+            latency_metrics = dict(jupiter_api._latency_tracker.get_metrics())
         except Exception:
             latency_metrics = {
                 'avg_latency_ms': 0,
@@ -1173,7 +1173,7 @@ def api_run_stress_test():
                     'max_drawdown': result.max_drawdown,
                     'recovery_days': result.recovery_days,
                     'volatility': result.volatility,
-                    'nav_path': result.nav_path,
+                    'nav_path': result.nav_path.tolist(),
                 }
             })
         else:
@@ -1189,7 +1189,7 @@ def api_run_stress_test():
                     'max_drawdown': result.max_drawdown,
                     'recovery_days': result.recovery_days,
                     'volatility': result.volatility,
-                    'nav_path': result.nav_path[:30],  # First 30 days
+                    'nav_path': result.nav_path[:30].tolist(),  # First 30 days
                 }
             })
             
@@ -1372,8 +1372,8 @@ def simulate_tax_impact():
             if token in quotes:
                 current_price = quotes[token]
                 
-                if token in tax_sim.lots and tax_sim.lots[token]:
-                    total_lots_quantity = sum(lot.quantity for lot in tax_sim.lots[token])
+                if token in tax_sim.lots:
+                    total_lots_quantity = float(tax_sim.lots[token]['qty'].sum())
                     sell_quantity = total_lots_quantity * 0.3  # Sell 30% of holdings
                     
                     if sell_quantity > 0:
@@ -1,12 +1,69 @@
 import requests
+import numpy as np
 import logging
+import importlib.util
 import time
 import random
 import statistics
-from typing import Dict, Optional, List, Tuple
+from typing import Any, Dict, Optional, List, Tuple
 from collections import deque, defaultdict
 from datetime import datetime, timedelta
 
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup; fall back to stdlib json
+    orjson = None
+
+try:
+    import httpx
+except ImportError:  # httpx is optional; fall back to requests.Session
+    httpx = None
+
+try:
+    import numba
+except ImportError:  # numba is optional; the ladder math runs as plain Python
+    numba = None
+
+# Transport errors raised by whichever HTTP client backs the session
+HTTP_ERRORS = (requests.exceptions.RequestException,) + ((httpx.HTTPError,) if httpx is not None else ())
+
+
+def _parse_json(response) -> Any:
+    """Decode a JSON response body, using orjson on the raw bytes when available"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+
+def _create_session(headers: Dict[str, str]):
+    """Create a pooled HTTP client, preferring httpx with HTTP/2 multiplexing"""
+    if httpx is not None:
+        return httpx.Client(
+            http2=importlib.util.find_spec('h2') is not None,
+            headers=headers,
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=16, max_connections=32)
+        )
+    
+    session = requests.Session()
+    session.headers.update(headers)
+    return session
+
+
+def _ladder_slippage_bps(in_amounts: np.ndarray, out_amounts: np.ndarray,
+                         input_price: float, output_price: float) -> np.ndarray:
+    """Slippage in bps of each quoted ladder rung versus the input token's spot price"""
+    n = in_amounts.shape[0]
+    slippage = np.empty(n, np.int64)
+    for i in range(n):
+        effective_price = (out_amounts[i] / 1e6) * output_price / (in_amounts[i] / 1e6)
+        bps = int((1.0 - effective_price / input_price) * 10000.0)
+        slippage[i] = bps if bps > 0 else 0
+    return slippage
+
+if numba is not None:
+    _ladder_slippage_bps = numba.njit(cache=True, fastmath=True)(_ladder_slippage_bps)
+
 class LRUCache:
     """Simple LRU Cache implementation with TTL support"""
     
@@ -16,6 +73,7 @@ class LRUCache:
         self.cache = {}
         self.access_order = deque()  # Most recently used at the end
         self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._stats_cache: Optional[Tuple[float, Dict]] = None  # (monotonic time, payload)
     
     def get(self, key: str) -> Optional[Dict]:
         """Get item from cache if valid and not expired"""
@@ -58,15 +116,22 @@ class LRUCache:
             
             self.cache[key] = {'value': value, 'timestamp': current_time}
             self.access_order.append(key)
+        
+        self._stats_cache = None
     
     def _remove(self, key: str) -> None:
         """Remove key from cache"""
         if key in self.cache:
             del self.cache[key]
             self.access_order.remove(key)
+            self._stats_cache = None
     
     def get_stats(self) -> Dict:
-        """Get cache statistics"""
+        """Get cache statistics (memoized for 1 second to absorb dashboard polling)"""
+        now = time.monotonic()
+        if self._stats_cache and now - self._stats_cache[0] < 1.0:
+            return self._stats_cache[1]
+        
         total_requests = self.stats['hits'] + self.stats['misses']
         hit_rate = (self.stats['hits'] / total_requests * 100) if total_requests > 0 else 0
         
@@ -77,7 +142,7 @@ class LRUCache:
             remaining = max(0, self.ttl_seconds - (current_time - item['timestamp']))
             ttl_remaining[key] = remaining
         
-        return {
+        result = {
             'hits': self.stats['hits'],
             'misses': self.stats['misses'],
             'hit_rate': round(hit_rate, 2),
@@ -87,6 +152,8 @@ class LRUCache:
             'ttl_seconds': self.ttl_seconds,
             'ttl_remaining': ttl_remaining
         }
+        self._stats_cache = (now, result)
+        return result
 
 class LatencyTracker:
     """Track API call latency and error rates"""
@@ -97,6 +164,7 @@ class LatencyTracker:
         self.errors = deque(maxlen=max_samples)  # Track last N calls success/failure
         self.total_calls = 0
         self.total_errors = 0
+        self._metrics_cache: Optional[Tuple[float, Dict]] = None  # (monotonic time, payload)
     
     def record_call(self, latency_ms: float, success: bool = True) -> None:
         """Record a call's latency and success status"""
@@ -105,9 +173,14 @@ class LatencyTracker:
         self.total_calls += 1
         if not success:
             self.total_errors += 1
+        self._metrics_cache = None
     
     def get_metrics(self) -> Dict:
-        """Get latency and error rate metrics"""
+        """Get latency and error rate metrics (memoized for 1 second)"""
+        now = time.monotonic()
+        if self._metrics_cache and now - self._metrics_cache[0] < 1.0:
+            return self._metrics_cache[1]
+        
         if not self.latencies:
             return {
                 'avg_latency_ms': 0,
@@ -128,7 +201,7 @@ class LatencyTracker:
         recent_calls = len(self.errors)
         error_rate = (recent_errors / recent_calls * 100) if recent_calls > 0 else 0
         
-        return {
+        result = {
             'avg_latency_ms': round(avg_latency, 2),
             'p50_latency_ms': round(p50_latency, 2),
             'p95_latency_ms': round(p95_latency, 2),
@@ -136,6 +209,8 @@ class LatencyTracker:
             'total_calls': self.total_calls,
             'recent_calls': recent_calls
         }
+        self._metrics_cache = (now, result)
+        return result
 
 class JupiterAPI:
     """Jupiter API client for Solana token pricing with advanced caching and monitoring"""
@@ -143,8 +218,7 @@ class JupiterAPI:
     def __init__(self):
         self.base_url = "https://price.jup.ag/v4"
         self.quote_url = "https://quote-api.jup.ag/v6"
-        self.session = requests.Session()
-        self.session.headers.update({
+        self.session = _create_session({
             'User-Agent': 'Retirement-Portfolio-Builder/1.0'
         })
         
@@ -156,7 +230,8 @@ class JupiterAPI:
         
         # Health tracking  
         self._connection_healthy = True
-        self._last_health_check = 0
+        self._last_health_check = 0  # time.monotonic() of the last real check
+        self._cached_health_status = None  # {healthy_flag: status dict} from the last real check
         
         # Token mint to symbol mapping for fallback APIs
         self._mint_to_symbol = {
@@ -175,11 +250,19 @@ class JupiterAPI:
             'Es9vMFrzaCERmJfrF4H2FYD4KCoNkY11McCe8BenwNYB': 'USDTUSD'  # USDT
         }
         
+        # External fallbacks in priority order, each gated by its mint mapping
+        self._fallback_chain = [
+            (self._mint_to_symbol, self._get_coingecko_price),
+            (self._mint_to_kraken, self._get_kraken_price)
+        ]
+        self._fallback_timeout = 3  # Fallbacks are already on the slow path; fail fast
+        
     def get_price(self, mint_address: str) -> float:
         """Get current price for a token mint address with enhanced caching and monitoring"""
         start_time = time.time()
         
-        # Check LRU cache first
+        # Check LRU cache first; get() evicts an expired entry, so keep it as the last good quote
+        stale_item = self._price_cache.cache.get(mint_address)
         cached_item = self._price_cache.get(mint_address)
         if cached_item:
             return cached_item['value']
@@ -196,10 +279,11 @@ class JupiterAPI:
             latency_ms = (time.time() - start_time) * 1000
             self._latency_tracker.record_call(latency_ms, success=True)
             
-            data = response.json()
+            data = _parse_json(response)
             
-            if 'data' in data and mint_address in data['data']:
-                price = float(data['data'][mint_address]['price'])
+            entry = (data.get('data') or {}).get(mint_address)
+            if entry is not None:
+                price = float(entry['price'])
                 
                 # Cache the result with LRU cache
                 self._price_cache.put(mint_address, price)
@@ -211,7 +295,7 @@ class JupiterAPI:
                 self._latency_tracker.record_call((time.time() - start_time) * 1000, success=False)
                 return 0.0
                 
-        except requests.exceptions.RequestException as e:
+        except HTTP_ERRORS as e:
             # Record failed call
             latency_ms = (time.time() - start_time) * 1000
             self._latency_tracker.record_call(latency_ms, success=False)
@@ -219,26 +303,7 @@ class JupiterAPI:
             logging.error(f"Error fetching price for {mint_address}: {e}")
             self._connection_healthy = False
             
-            # Try to get from cache even if expired (last-good-quote fallback)
-            if mint_address in self._price_cache.cache:
-                cached_item = self._price_cache.cache[mint_address]
-                logging.warning(f"Using last-good-quote fallback for {mint_address}")
-                return cached_item['value']
-                
-            # Try CoinGecko as fallback
-            coingecko_price = self._get_coingecko_price(mint_address)
-            if coingecko_price > 0:
-                self._price_cache.put(mint_address, coingecko_price)
-                return coingecko_price
-                
-            # Try Kraken as final fallback for SOL and USDC
-            kraken_price = self._get_kraken_price(mint_address)
-            if kraken_price > 0:
-                self._price_cache.put(mint_address, kraken_price)
-                return kraken_price
-                
-            # Use our fallback price system
-            return self._get_fallback_price(mint_address)
+            return self._get_missing_price(mint_address, stale_item)
         except (KeyError, ValueError) as e:
             logging.error(f"Error parsing price response for {mint_address}: {e}")
             return 0.0
@@ -248,6 +313,8 @@ class JupiterAPI:
         if not mint_addresses:
             return {}
         
+        start_time = time.time()
+        
         try:
             # Join mint addresses with comma
             ids = ','.join(mint_addresses)
@@ -257,48 +324,71 @@ class JupiterAPI:
             response = self.session.get(url, params=params, timeout=15)
             response.raise_for_status()
             
-            data = response.json()
+            # Record latency
+            latency_ms = (time.time() - start_time) * 1000
+            self._latency_tracker.record_call(latency_ms, success=True)
+            
+            data = _parse_json(response)
             prices = {}
-            current_time = time.time()
             
-            if 'data' in data:
-                for mint_address in mint_addresses:
-                    if mint_address in data['data']:
-                        price = float(data['data'][mint_address]['price'])
-                        prices[mint_address] = price
-                        
-                        # Cache the result
-                        self._price_cache[mint_address] = {
-                            'price': price,
-                            'timestamp': current_time
-                        }
-                    else:
-                        # Try to use cached data or fallback prices
-                        if mint_address in self._price_cache:
-                            prices[mint_address] = self._price_cache[mint_address]['price']
-                        else:
-                            # Try individual fallbacks for missing tokens
-                            fallback_price = self._get_fallback_price(mint_address)
-                            prices[mint_address] = fallback_price
+            # Walk what the API returned once, with hot names bound locally
+            price_data = data.get('data') or {}
+            _float = float
+            put = self._price_cache.put
+            for mint_address, entry in price_data.items():
+                price = _float(entry['price'])
+                prices[mint_address] = price
+                put(mint_address, price)
+            
+            if prices:
+                self._connection_healthy = True
+            
+            # Second pass: fill mints missing from the response from cache or fallbacks
+            missing = [mint_address for mint_address in mint_addresses if mint_address not in prices]
+            if missing:
+                logging.warning(f"No price data found for mints {missing}")
+                self._latency_tracker.record_call(latency_ms, success=False)
+            for mint_address in missing:
+                prices[mint_address] = self._get_missing_price(mint_address)
             
             return prices
             
-        except requests.exceptions.RequestException as e:
+        except HTTP_ERRORS as e:
+            # Record failed call
+            latency_ms = (time.time() - start_time) * 1000
+            self._latency_tracker.record_call(latency_ms, success=False)
+            
             logging.error(f"Error fetching multiple prices: {e}")
-            # Return cached prices if available, otherwise try fallbacks
-            prices = {}
-            for mint_address in mint_addresses:
-                if mint_address in self._price_cache:
-                    prices[mint_address] = self._price_cache[mint_address]['price']
-                else:
-                    # Try individual fallbacks for each token
-                    fallback_price = self._get_fallback_price(mint_address)
-                    prices[mint_address] = fallback_price
-            return prices
+            self._connection_healthy = False
+            return {mint_address: self._get_missing_price(mint_address) for mint_address in mint_addresses}
         except (KeyError, ValueError) as e:
             logging.error(f"Error parsing multiple price response: {e}")
             return {mint: 0.0 for mint in mint_addresses}
     
+    def _get_missing_price(self, mint_address: str, stale_item: Optional[Dict] = None) -> float:
+        """Price a mint Jupiter didn't (single or batch): fresh cache, then CoinGecko/Kraken, then last good quote"""
+        stale_item = stale_item or self._price_cache.cache.get(mint_address)  # get() evicts expired entries
+        cached_item = self._price_cache.get(mint_address)
+        if cached_item:
+            return cached_item['value']
+        
+        # Try CoinGecko, then Kraken, skipping providers with no mapping for this mint
+        for mapping, fetch_price in self._fallback_chain:
+            if mint_address in mapping:
+                price = fetch_price(mint_address)
+                if price > 0:
+                    self._price_cache.put(mint_address, price)
+                    return price
+        
+        # Expired entries are only a last resort, before the emergency table
+        if stale_item:
+            logging.warning(f"Using last-good-quote fallback for {mint_address}")
+            # Re-cache for one TTL so the quote outlives get()'s eviction; fallbacks are retried after
+            self._price_cache.put(mint_address, stale_item['value'])
+            return stale_item['value']
+        
+        return self._get_fallback_price(mint_address)
+    
     def get_quote(self, input_mint: str, output_mint: str, amount: int) -> Optional[Dict]:
         """Get a quote for swapping tokens (for slippage estimation)"""
         try:
@@ -313,9 +403,9 @@ class JupiterAPI:
             response = self.session.get(url, params=params, timeout=10)
             response.raise_for_status()
             
-            return response.json()
+            return _parse_json(response)
             
-        except requests.exceptions.RequestException as e:
+        except HTTP_ERRORS as e:
             logging.error(f"Error fetching quote: {e}")
             return None
         except ValueError as e:
@@ -335,10 +425,10 @@ class JupiterAPI:
                 'vs_currencies': 'usd'
             }
             
-            response = self.session.get(url, params=params, timeout=10)
+            response = self.session.get(url, params=params, timeout=self._fallback_timeout)
             response.raise_for_status()
             
-            data = response.json()
+            data = _parse_json(response)
             if symbol in data and 'usd' in data[symbol]:
                 price = float(data[symbol]['usd'])
                 logging.info(f"CoinGecko fallback price for {mint_address}: ${price}")
@@ -359,10 +449,10 @@ class JupiterAPI:
             url = "https://api.kraken.com/0/public/Ticker"
             params = {'pair': kraken_symbol}
             
-            response = self.session.get(url, params=params, timeout=10)
+            response = self.session.get(url, params=params, timeout=self._fallback_timeout)
             response.raise_for_status()
             
-            data = response.json()
+            data = _parse_json(response)
             if 'result' in data and kraken_symbol in data['result']:
                 price = float(data['result'][kraken_symbol]['c'][0])  # Last trade price
                 logging.info(f"Kraken fallback price for {mint_address}: ${price}")
@@ -398,15 +488,13 @@ class JupiterAPI:
 
     def health_check(self) -> dict:
         """Check API health and return detailed status"""
-        current_time = time.time()
+        # Only check health every 30 seconds; monotonic clock is immune to wall-clock jumps
+        now = time.monotonic()
+        if self._cached_health_status is not None and now - self._last_health_check < 30:
+            return self._cached_health_status[self._connection_healthy]
         
-        # Only check health every 30 seconds
-        if current_time - self._last_health_check < 30 and self._last_health_check > 0:
-            return {
-                "healthy": self._connection_healthy,
-                "last_check": self._last_health_check,
-                "message": "Using cached health status"
-            }
+        current_time = time.time()
+        self._last_health_check = now
         
         try:
             # Try a simple price request to SOL
@@ -420,9 +508,7 @@ class JupiterAPI:
             response_time = int((time.time() - start_time) * 1000)
             
             self._connection_healthy = True
-            self._last_health_check = current_time
-            
-            return {
+            status = {
                 "healthy": True,
                 "last_check": current_time,
                 "message": "Jupiter API is responsive",
@@ -431,38 +517,50 @@ class JupiterAPI:
             
         except Exception as e:
             self._connection_healthy = False
-            self._last_health_check = current_time
-            
-            return {
+            status = {
                 "healthy": False,
                 "last_check": current_time,
                 "message": f"Jupiter API error: {str(e)[:100]}",
                 "using_fallback": True
             }
+        
+        # Prebuild both debounced answers so polls within the window return a shared dict
+        self._cached_health_status = {
+            healthy: {
+                "healthy": healthy,
+                "last_check": current_time,
+                "message": "Using cached health status"
+            }
+            for healthy in (True, False)
+        }
+        return status
 
     def get_ladder_quotes(self, input_mint: str, output_mint: str, sizes_usd: list) -> list:
         """Get ladder quotes for different trade sizes"""
         ladder_data = []
+        quoted_rungs = []  # (ladder index, input amount, output amount) for live quotes
+        
+        input_price = self.get_price(input_mint)
+        if input_price == 0:
+            return ladder_data
+        output_price = None
         
         for size_usd in sizes_usd:
             try:
                 # Convert USD to input token amount (rough approximation)
-                input_price = self.get_price(input_mint)
-                if input_price == 0:
-                    continue
-                    
                 input_amount = int((size_usd / input_price) * 1e6)  # Assume 6 decimals
                 
                 quote = self.get_quote(input_mint, output_mint, input_amount)
                 
                 if quote:
-                    # Calculate effective price and slippage
                     output_amount = int(quote.get('outAmount', 0))
-                    output_price = self.get_price(output_mint)
+                    if output_price is None:
+                        output_price = self.get_price(output_mint)
                     
-                    if output_amount > 0 and output_price > 0:
-                        effective_price = (output_amount / 1e6) * output_price / (input_amount / 1e6)
-                        slippage_bps = max(0, int((1 - effective_price / input_price) * 10000))
+                    if output_amount > 0 and output_price > 0 and input_amount > 0:
+                        # Slippage is computed for all quoted rungs in one batch below
+                        quoted_rungs.append((len(ladder_data), input_amount, output_amount))
+                        slippage_bps = 0
                     else:
                         slippage_bps = 500  # 5% fallback
                 else:
@@ -480,9 +578,20 @@ class JupiterAPI:
                 ladder_data.append({
                     "size_usd": size_usd,
                     "slippage_bps": 200 + int(size_usd / 2000),
-                    "effective_price": self.get_price(input_mint) * 0.98
+                    "effective_price": input_price * 0.98
                 })
         
+        if quoted_rungs:
+            indices, in_amounts, out_amounts = zip(*quoted_rungs)
+            slippage = _ladder_slippage_bps(
+                np.array(in_amounts, dtype=np.float64),
+                np.array(out_amounts, dtype=np.float64),
+                float(input_price), float(output_price)
+            )
+            for idx, slippage_bps in zip(indices, slippage.tolist()):
+                ladder_data[idx]["slippage_bps"] = slippage_bps
+                ladder_data[idx]["effective_price"] = input_price * (1 - slippage_bps / 10000)
+        
         return ladder_data
     
     def get_cache_stats(self) -> Dict:
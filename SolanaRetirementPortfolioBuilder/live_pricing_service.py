@@ -3,23 +3,52 @@ Live Pricing Service with Jupiter API Primary + CoinGecko Fallback
 Background polling every 10 seconds with intelligent retry logic
 """
 import threading
+import importlib.util
 import time
 import logging
 import requests
-from typing import Dict, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
 from datetime import datetime, timedelta
 import json
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # orjson is an optional speedup; fall back to stdlib json
+    _json_loads = json.loads
+
+try:
+    import httpx
+except ImportError:  # httpx is optional; fall back to a pooled requests.Session
+    httpx = None
+
 class LivePricingService:
     """Background service for continuous live price updates"""
     
     def __init__(self):
         self.prices = {}
-        self.last_update = {}
+        self.last_update = {}  # time.monotonic() of each token's last successful update
         self.is_running = False
         self.polling_thread = None
         self.update_interval = 10  # 10 seconds
         
+        # Worker pool for concurrent fallback fetches
+        self.executor = ThreadPoolExecutor(max_workers=8)
+        
+        # Per-token count of polls that found the price past its TTL, for tuning TTLs
+        self.stale_hits = {}
+        
+        # Consecutive failed refresh cycles per token; a last-known price is served
+        # for up to max_stale_ttls x its TTL, then dropped rather than passed off as live
+        self.failure_count = {}
+        self.max_stale_ttls = 5
+        
+        # (url, params) -> (ETag, parsed prices) from the last 200, for conditional GETs
+        self._etag_cache = {}
+        
         # Rate limiting and retry logic
         self.jupiter_rate_limit_reset = 0
         self.coingecko_rate_limit_reset = 0
@@ -29,44 +58,91 @@ class LivePricingService:
         self.jupiter_url = "https://price.jup.ag/v4/price"
         self.coingecko_url = "https://api.coingecko.com/api/v3/simple/price"
         
-        # Token mappings
+        # Token mappings; 'ttl' is the refresh interval in seconds, matched to how
+        # quickly each token's price actually moves
         self.tokens = {
             'SOL': {
                 'jupiter_id': 'So11111111111111111111111111111111111111112',
                 'coingecko_id': 'solana',
-                'kraken_pair': 'SOLUSD'
+                'kraken_pair': 'SOLUSD',
+                'ttl': 10  # volatile
             },
             'mSOL': {
                 'jupiter_id': 'mSoLzYCxHdYgdzU16g5QSh3i5K3z3KZK7ytfqcJm7So',
                 'coingecko_id': 'marinade-staked-sol',
-                'kraken_pair': None
+                'kraken_pair': None,
+                'ttl': 30  # staked SOL
             },
             'stSOL': {
                 'jupiter_id': '7dHbWXmci3dT8UFYWYZweBLXgycu7Y3iL6trKn1Y7ARj',
                 'coingecko_id': 'lido-staked-sol',
-                'kraken_pair': None
+                'kraken_pair': None,
+                'ttl': 30  # staked SOL
             },
             'BONK': {
                 'jupiter_id': 'DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263',
                 'coingecko_id': 'bonk',
-                'kraken_pair': None
+                'kraken_pair': None,
+                'ttl': 10  # volatile
             },
             'USDC': {
                 'jupiter_id': 'EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v',
                 'coingecko_id': 'usd-coin',
-                'kraken_pair': 'USDCUSD'
+                'kraken_pair': 'USDCUSD',
+                'ttl': 60  # stablecoin
             },
             'USDT': {
                 'jupiter_id': 'Es9vMFrzaCERmJfrF4H2FYD4KCoNkY11McCe8BenwNYB',
                 'coingecko_id': 'tether',
-                'kraken_pair': 'USDTUSD'
+                'kraken_pair': 'USDTUSD',
+                'ttl': 60  # stablecoin
             }
         }
         
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Solana-Portfolio-Builder/2.0'
-        })
+        # Precomputed Jupiter batch parameter and reverse lookup for the hot path
+        self._jupiter_ids_param = ','.join(info['jupiter_id'] for info in self.tokens.values())
+        self._jup_id_to_symbol = {info['jupiter_id']: token for token, info in self.tokens.items()}
+        
+        self.session = self._create_session()
+        
+    def _create_session(self):
+        """Create the HTTP client, preferring httpx with HTTP/2 multiplexing per upstream host"""
+        headers = {
+            'User-Agent': 'Solana-Portfolio-Builder/2.0',
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip'
+        }
+        
+        if httpx is not None:
+            http2 = importlib.util.find_spec('h2') is not None
+            return httpx.Client(
+                headers=headers,
+                timeout=8.0,
+                transport=httpx.HTTPTransport(
+                    http2=http2,
+                    retries=2,
+                    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+                )
+            )
+        
+        session = requests.Session()
+        session.headers.update(headers)
+        session.headers['Connection'] = 'keep-alive'
+        
+        # Pool keep-alive connections per upstream host so TLS handshakes are
+        # amortized across polls, and retry transient gateway errors
+        adapter = HTTPAdapter(
+            pool_connections=8,
+            pool_maxsize=32,
+            max_retries=Retry(
+                total=2,
+                backoff_factor=0.3,
+                status_forcelist=[502, 503, 504],
+                allowed_methods=["GET"]
+            )
+        )
+        session.mount("https://", adapter)
+        return session
         
     def start_polling(self):
         """Start background polling for live prices"""
@@ -97,97 +173,138 @@ class LivePricingService:
                 
     def _update_all_prices(self):
         """Update all token prices with fallback chain"""
-        updated_count = 0
+        # Only refresh tokens whose price has outlived its TTL
+        now = time.monotonic()
+        due_tokens = [token for token, info in self.tokens.items()
+                      if token not in self.last_update or now - self.last_update[token] > info['ttl']]
+        if not due_tokens:
+            return
+        for token in due_tokens:
+            self.stale_hits[token] = self.stale_hits.get(token, 0) + 1
         
-        # Try Jupiter API first (batch request for efficiency)
-        jupiter_prices = self._fetch_jupiter_batch()
-        if jupiter_prices:
-            for token, price in jupiter_prices.items():
+        # Build this cycle's snapshot privately and publish it with one reference swap,
+        # so readers never see a half-updated dict and never need to copy it
+        new_prices = dict(self.prices)
+        new_updates = dict(self.last_update)
+        updated = set()
+        
+        def apply(prices: Dict[str, float]) -> None:
+            for token, price in prices.items():
                 if price > 0:
-                    self.prices[token] = price
-                    self.last_update[token] = time.time()
-                    updated_count += 1
-                    
-        # For tokens not updated by Jupiter, try ALL available sources
-        missing_tokens = [token for token in self.tokens.keys() 
-                         if token not in jupiter_prices or jupiter_prices.get(token, 0) <= 0]
-        
-        for token in missing_tokens:
-            # Try Kraken first for supported tokens (faster & more reliable)
-            kraken_price = self._fetch_kraken_price(token)
-            if kraken_price > 0:
-                self.prices[token] = kraken_price
-                self.last_update[token] = time.time()
-                updated_count += 1
-                continue
-                
-            # Then try CoinGecko with multiple strategies
-            price = self._fetch_coingecko_price(token)
-            if price > 0:
-                self.prices[token] = price
-                self.last_update[token] = time.time()
-                updated_count += 1
+                    new_prices[token] = price
+                    new_updates[token] = time.monotonic()
+                    updated.add(token)
+        
+        # Try Jupiter API first (batch request for efficiency)
+        apply(self._fetch_jupiter_batch(due_tokens))
+        
+        # For tokens not updated by Jupiter, try ALL available sources in priority order
+        # Kraken first for supported tokens (faster & more reliable), one request per pair
+        missing_tokens = [token for token in due_tokens if token not in updated]
+        kraken_tokens = [token for token in missing_tokens if self.tokens[token]['kraken_pair']]
+        apply(self._fetch_concurrently(self._fetch_kraken_price, kraken_tokens))
+        
+        # Then CoinGecko, batched into a single request for everything still missing
+        missing_tokens = [token for token in missing_tokens if token not in updated]
+        if missing_tokens:
+            apply(self._fetch_coingecko_batch(missing_tokens))
+        
+        # If still no price, try alternative data sources
+        missing_tokens = [token for token in missing_tokens if token not in updated]
+        apply(self._fetch_concurrently(self._fetch_alternative_price, missing_tokens))
+        
+        # Serve last-known prices for tokens that failed this cycle only within the staleness bound
+        now = time.monotonic()
+        for token in due_tokens:
+            if token in updated:
+                self.failure_count[token] = 0
                 continue
-                
-            # If still no price, try alternative data sources
-            alt_price = self._fetch_alternative_price(token)
-            if alt_price > 0:
-                self.prices[token] = alt_price
-                self.last_update[token] = time.time()
-                updated_count += 1
+            self.failure_count[token] = self.failure_count.get(token, 0) + 1
+            max_stale = self.max_stale_ttls * self.tokens[token]['ttl']
+            if token in new_prices and now - new_updates.get(token, 0) > max_stale:
+                new_prices.pop(token)
+                logging.warning(f"⚠️ Dropping {token} price: no update for over {max_stale}s")
+        
+        # Reference assignment is atomic; publish prices before their timestamps
+        self.prices = new_prices
+        self.last_update = new_updates
                     
-        if updated_count > 0:
-            logging.info(f"📈 Updated {updated_count}/{len(self.tokens)} live prices")
+        if updated:
+            logging.info(f"📈 Updated {len(updated)}/{len(self.tokens)} live prices")
+            
+    def _fetch_concurrently(self, fetch_price: Callable[[str], float], tokens: List[str]) -> Dict[str, float]:
+        """Run a per-token fetcher for all tokens on the executor; I/O-bound, so this costs one RTT"""
+        futures = {self.executor.submit(fetch_price, token): token for token in tokens}
+        return {futures[future]: future.result() for future in as_completed(futures)}
             
-    def _fetch_jupiter_batch(self) -> Dict[str, float]:
-        """Fetch all prices from Jupiter API in one batch request"""
-        if time.time() < self.jupiter_rate_limit_reset:
+    def _fetch_jupiter_batch(self, tokens: List[str]) -> Dict[str, float]:
+        """Fetch prices for the given tokens from Jupiter API in one batch request"""
+        if time.monotonic() < self.jupiter_rate_limit_reset:
             return {}
             
         try:
-            # Build batch request with all Jupiter IDs
-            jupiter_ids = [info['jupiter_id'] for info in self.tokens.values()]
-            ids_param = ','.join(jupiter_ids)
+            # Build batch request, reusing the precomputed IDs when every token is due
+            if len(tokens) == len(self.tokens):
+                ids_param = self._jupiter_ids_param
+            else:
+                ids_param = ','.join(self.tokens[token]['jupiter_id'] for token in tokens)
             
-            response = self.session.get(
-                self.jupiter_url,
-                params={'ids': ids_param},
-                timeout=8
-            )
+            response, cache_key = self._conditional_get(self.jupiter_url, {'ids': ids_param}, timeout=8)
+            
+            if response.status_code == 304 and cache_key in self._etag_cache:
+                # Unchanged since the last fetch: the cached prices are confirmed fresh
+                return dict(self._etag_cache[cache_key][1])
             
             if response.status_code == 429:
                 # Rate limited - set backoff
-                self.jupiter_rate_limit_reset = time.time() + 60
+                self.jupiter_rate_limit_reset = time.monotonic() + 60
                 logging.warning("⏱️ Jupiter API rate limited, waiting 60s")
                 return {}
                 
             response.raise_for_status()
-            data = response.json()
+            data = _json_loads(response.content)
             
             # Map Jupiter response back to token symbols
             prices = {}
-            if 'data' in data:
-                for token, info in self.tokens.items():
-                    jupiter_id = info['jupiter_id']
-                    if jupiter_id in data['data']:
-                        price = float(data['data'][jupiter_id]['price'])
-                        prices[token] = price
-                        logging.debug(f"🟢 Jupiter: {token} = ${price:.6f}")
-                        
+            for jupiter_id, entry in (data.get('data') or {}).items():
+                token = self._jup_id_to_symbol.get(jupiter_id)
+                if token is None:
+                    continue
+                price = float(entry['price'])
+                prices[token] = price
+                logging.debug(f"🟢 Jupiter: {token} = ${price:.6f}")
+            
+            self._remember_etag(cache_key, response, prices)
             return prices
             
         except Exception as e:
             logging.warning(f"Jupiter batch fetch failed: {e}")
             return {}
             
-    def _fetch_coingecko_price(self, token: str) -> float:
-        """Fetch individual token price from CoinGecko with retry logic"""
-        if time.time() < self.coingecko_rate_limit_reset:
-            return 0.0
+    def _conditional_get(self, url: str, params: Dict[str, str], timeout: float):
+        """GET with If-None-Match from the last 200 for the same request; returns (response, cache_key)"""
+        cache_key = (url, tuple(sorted(params.items())))
+        cached = self._etag_cache.get(cache_key)
+        headers = {'If-None-Match': cached[0]} if cached else None
+        response = self.session.get(url, params=params, timeout=timeout, headers=headers)
+        return response, cache_key
+        
+    def _remember_etag(self, cache_key: tuple, response, prices: Dict[str, float]) -> None:
+        """Store the response ETag with its parsed prices so a later 304 can reuse them"""
+        etag = response.headers.get('ETag')
+        if etag:
+            self._etag_cache[cache_key] = (etag, dict(prices))
             
-        token_info = self.tokens.get(token)
-        if not token_info or not token_info['coingecko_id']:
-            return 0.0
+    def _fetch_coingecko_batch(self, tokens: List[str]) -> Dict[str, float]:
+        """Fetch prices for several tokens from CoinGecko in one request, with retry logic"""
+        if time.monotonic() < self.coingecko_rate_limit_reset:
+            return {}
+            
+        id_to_token = {self.tokens[token]['coingecko_id']: token for token in tokens
+                       if token in self.tokens and self.tokens[token]['coingecko_id']}
+        if not id_to_token:
+            return {}
+        ids = ','.join(id_to_token)
             
         # Try multiple CoinGecko strategies
         strategies = [
@@ -195,7 +312,7 @@ class LivePricingService:
             {
                 'url': self.coingecko_url,
                 'params': {
-                    'ids': token_info['coingecko_id'],
+                    'ids': ids,
                     'vs_currencies': 'usd',
                     'include_24hr_change': 'false'
                 }
@@ -204,7 +321,7 @@ class LivePricingService:
             {
                 'url': "https://pro-api.coingecko.com/api/v3/simple/price",
                 'params': {
-                    'ids': token_info['coingecko_id'],
+                    'ids': ids,
                     'vs_currencies': 'usd'
                 }
             }
@@ -212,32 +329,37 @@ class LivePricingService:
         
         for strategy in strategies:
             try:
-                response = self.session.get(
-                    strategy['url'],
-                    params=strategy['params'],
-                    timeout=6
-                )
+                response, cache_key = self._conditional_get(strategy['url'], strategy['params'], timeout=6)
+                
+                if response.status_code == 304 and cache_key in self._etag_cache:
+                    return dict(self._etag_cache[cache_key][1])
                 
                 if response.status_code == 429:
                     continue  # Try next strategy
                     
                 response.raise_for_status()
-                data = response.json()
+                data = _json_loads(response.content)
                 
-                coingecko_id = token_info['coingecko_id']
-                if coingecko_id in data and 'usd' in data[coingecko_id]:
-                    price = float(data[coingecko_id]['usd'])
-                    logging.info(f"🟡 CoinGecko: {token} = ${price:.6f}")
-                    return price
+                prices = {}
+                for coingecko_id, token in id_to_token.items():
+                    quote = data.get(coingecko_id)
+                    if quote and 'usd' in quote:
+                        price = float(quote['usd'])
+                        prices[token] = price
+                        logging.info(f"🟡 CoinGecko: {token} = ${price:.6f}")
+                
+                if prices:
+                    self._remember_etag(cache_key, response, prices)
+                    return prices
                     
             except Exception as e:
-                logging.debug(f"CoinGecko strategy failed for {token}: {e}")
+                logging.debug(f"CoinGecko strategy failed for {ids}: {e}")
                 continue
         
         # All strategies failed - set rate limit if 429
-        self.coingecko_rate_limit_reset = time.time() + 30  # Shorter backoff
-        logging.warning(f"⏱️ CoinGecko all strategies failed for {token}")
-        return 0.0
+        self.coingecko_rate_limit_reset = time.monotonic() + 30  # Shorter backoff
+        logging.warning(f"⏱️ CoinGecko all strategies failed for {ids}")
+        return {}
         
     def _fetch_kraken_price(self, token: str) -> float:
         """Fetch price from Kraken as final fallback"""
@@ -253,7 +375,7 @@ class LivePricingService:
             )
             response.raise_for_status()
             
-            data = response.json()
+            data = _json_loads(response.content)
             pair = token_info['kraken_pair']
             if 'result' in data and pair in data['result']:
                 price = float(data['result'][pair]['c'][0])
@@ -280,7 +402,7 @@ class LivePricingService:
             )
             response.raise_for_status()
             
-            data = response.json()
+            data = _json_loads(response.content)
             if 'pairs' in data and data['pairs']:
                 # Find best liquidity pair
                 best_pair = max(data['pairs'], key=lambda p: float(p.get('liquidity', {}).get('usd', 0)))
@@ -295,31 +417,39 @@ class LivePricingService:
         return 0.0
         
     def get_live_prices(self) -> Dict[str, float]:
-        """Get current live prices"""
-        return self.prices.copy()
+        """Get current live prices (a published snapshot; treat as read-only)"""
+        return self.prices
         
     def get_price(self, token: str) -> float:
         """Get individual token price"""
         return self.prices.get(token, 0.0)
         
-    def is_price_fresh(self, token: str, max_age_seconds: int = 30) -> bool:
-        """Check if price is fresh (updated within max_age_seconds)"""
-        last_update = self.last_update.get(token, 0)
-        return (time.time() - last_update) <= max_age_seconds
+    def is_price_fresh(self, token: str, max_age_seconds: Optional[int] = None) -> bool:
+        """Check if price is fresh (updated within max_age_seconds, default 3x the token TTL)"""
+        if max_age_seconds is None:
+            max_age_seconds = 3 * self.tokens.get(token, {}).get('ttl', 10)
+        last_update = self.last_update.get(token)
+        if last_update is None:
+            return False
+        return (time.monotonic() - last_update) <= max_age_seconds
         
     def get_status(self) -> Dict:
         """Get service status for monitoring"""
-        now = time.time()
-        fresh_count = sum(1 for token in self.tokens.keys() 
-                         if self.is_price_fresh(token, 30))
+        # One clock read for the whole status; freshness is inlined over last_update
+        now = time.monotonic()
+        last_update = self.last_update
+        fresh_count = sum(1 for token, ts in last_update.items()
+                          if token in self.tokens and now - ts <= 3 * self.tokens[token]['ttl'])
         
         return {
             'running': self.is_running,
             'total_tokens': len(self.tokens),
             'fresh_prices': fresh_count,
-            'last_updates': {token: now - ts for token, ts in self.last_update.items()},
+            'last_updates': {token: now - ts for token, ts in last_update.items()},
             'jupiter_rate_limited': now < self.jupiter_rate_limit_reset,
-            'coingecko_rate_limited': now < self.coingecko_rate_limit_reset
+            'coingecko_rate_limited': now < self.coingecko_rate_limit_reset,
+            'stale_hits': dict(self.stale_hits),
+            'failure_counts': dict(self.failure_count)
         }
 
 # Global instance
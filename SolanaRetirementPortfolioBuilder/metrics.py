@@ -1,10 +1,86 @@
 import numpy as np
-import pandas as pd
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 import math
 
+try:
+    import numba
+except ImportError:  # numba is optional; metrics fall back to the NumPy implementations
+    numba = None
+
+
+def _nav_stats_kernel(nav: np.ndarray, risk_free_rate: float):
+    """(annual volatility, Sharpe ratio, max drawdown) of a NAV array in a single pass"""
+    n = nav.shape[0]
+    count = 0
+    mean = 0.0
+    m2 = 0.0
+    peak = nav[0]
+    max_drawdown = 0.0
+    
+    for i in range(1, n):
+        prev = nav[i - 1]
+        ret = (nav[i] - prev) / prev if prev > 0 else 0.0
+        
+        # Welford running mean/variance of returns
+        count += 1
+        delta = ret - mean
+        mean += delta / count
+        m2 += delta * (ret - mean)
+        
+        if nav[i] > peak:
+            peak = nav[i]
+        drawdown = (peak - nav[i]) / max(peak, 1e-12)
+        if drawdown > max_drawdown:
+            max_drawdown = drawdown
+    
+    if count < 2:
+        return 0.0, 0.0, max_drawdown
+    
+    annual_vol = math.sqrt(m2 / count) * math.sqrt(252.0)
+    sharpe = (mean * 252.0 - risk_free_rate) / annual_vol if annual_vol > 0 else 0.0
+    return annual_vol, sharpe, max_drawdown
+
+
+def _beta_alpha_info_kernel(portfolio: np.ndarray, benchmark: np.ndarray, risk_free_rate: float):
+    """(beta, alpha, information ratio) of two aligned return arrays in a single pass"""
+    n = portfolio.shape[0]
+    if n < 2:
+        return 1.0, 0.0, 0.0
+    
+    p_mean = 0.0
+    b_mean = 0.0
+    e_mean = 0.0
+    co_moment = 0.0
+    b_m2 = 0.0
+    e_m2 = 0.0
+    
+    for i in range(n):
+        count = i + 1
+        p_delta = portfolio[i] - p_mean
+        b_delta = benchmark[i] - b_mean
+        p_mean += p_delta / count
+        b_mean += b_delta / count
+        co_moment += p_delta * (benchmark[i] - b_mean)
+        b_m2 += b_delta * (benchmark[i] - b_mean)
+        
+        excess = portfolio[i] - benchmark[i]
+        e_delta = excess - e_mean
+        e_mean += e_delta / count
+        e_m2 += e_delta * (excess - e_mean)
+    
+    # Sample covariance over population variance, matching np.cov / np.var
+    beta = (co_moment / (n - 1)) / (b_m2 / n) if b_m2 != 0 else 1.0
+    alpha = p_mean * 252.0 - (risk_free_rate + beta * (b_mean * 252.0 - risk_free_rate))
+    tracking = math.sqrt(e_m2 / n) * math.sqrt(252.0)
+    info_ratio = e_mean * 252.0 / tracking if tracking > 0 else 0.0
+    return beta, alpha, info_ratio
+
+if numba is not None:
+    _nav_stats_kernel = numba.njit(cache=True, fastmath=True)(_nav_stats_kernel)
+    _beta_alpha_info_kernel = numba.njit(cache=True, fastmath=True)(_beta_alpha_info_kernel)
+
 class MetricsCalculator:
     """Calculator for portfolio performance metrics"""
     
@@ -24,45 +100,49 @@ class MetricsCalculator:
         
         return nav
     
-    def calculate_returns(self, price_series: List[Dict]) -> List[float]:
+    def _nav_array(self, price_series: List[Dict]) -> np.ndarray:
+        """Extract NAV/value points from a price series into a float64 array"""
+        return np.fromiter((p.get('nav', p.get('value', 0.0)) for p in price_series),
+                           dtype=np.float64, count=len(price_series))
+    
+    def calculate_returns(self, price_series: List[Dict]) -> np.ndarray:
         """Calculate returns from price series"""
         if len(price_series) < 2:
-            return []
+            return np.empty(0)
         
-        returns = []
-        for i in range(1, len(price_series)):
-            prev_price = price_series[i-1].get('nav', price_series[i-1].get('value', 0))
-            curr_price = price_series[i].get('nav', price_series[i].get('value', 0))
-            
-            if prev_price > 0:
-                return_val = (curr_price - prev_price) / prev_price
-                returns.append(return_val)
-            else:
-                returns.append(0.0)
+        return self._returns_from_array(self._nav_array(price_series))
+    
+    def _returns_from_array(self, prices: np.ndarray) -> np.ndarray:
+        """Simple returns of a price array, zero wherever the previous price is non-positive"""
+        if prices.size < 2:
+            return np.empty(0)
         
-        return returns
+        prev_prices = prices[:-1]
+        return np.where(prev_prices > 0, np.diff(prices) / np.maximum(prev_prices, 1e-12), 0.0)
     
-    def calculate_volatility(self, returns: List[float]) -> float:
+    def calculate_volatility(self, returns: np.ndarray) -> float:
         """Calculate annualized volatility"""
         if len(returns) < 2:
             return 0.0
         
         return float(np.std(returns) * np.sqrt(252))  # Annualize assuming daily returns
     
-    def calculate_sharpe_ratio(self, returns: List[float]) -> float:
+    def calculate_sharpe_ratio(self, returns: np.ndarray) -> float:
         """Calculate Sharpe ratio"""
         if len(returns) < 2:
             return 0.0
         
-        mean_return = np.mean(returns)
-        volatility = np.std(returns)
+        # Reuse the mean for the variance instead of a separate np.std pass
+        returns = np.asarray(returns, dtype=np.float64)
+        mean_return = returns.mean()
+        variance = ((returns - mean_return) ** 2).mean()
         
-        if volatility == 0:
+        if variance == 0:
             return 0.0
         
         # Annualize
         annual_return = mean_return * 252
-        annual_vol = volatility * np.sqrt(252)
+        annual_vol = math.sqrt(variance * 252)
         
         return float((annual_return - self.risk_free_rate) / annual_vol)
     
@@ -71,78 +151,63 @@ class MetricsCalculator:
         if len(price_series) < 2:
             return 0.0
         
-        values = [p.get('nav', p.get('value', 0)) for p in price_series]
-        
-        peak = values[0]
-        max_drawdown = 0.0
-        
-        for value in values[1:]:
-            if value > peak:
-                peak = value
-            else:
-                drawdown = (peak - value) / peak
-                max_drawdown = max(max_drawdown, drawdown)
-        
-        return float(max_drawdown)
+        return self._max_drawdown(self._nav_array(price_series))
     
-    def calculate_beta(self, portfolio_returns: List[float], 
-                      benchmark_returns: List[float]) -> float:
+    def _max_drawdown(self, values: np.ndarray) -> float:
+        """Maximum peak-to-trough drawdown of a value array, as a fraction"""
+        peaks = np.maximum.accumulate(values)
+        drawdowns = (peaks - values) / np.maximum(peaks, 1e-12)
+        return float(drawdowns.max())
+    
+    def _regress(self, portfolio_returns: np.ndarray, benchmark_returns: np.ndarray) -> Tuple[float, float, float, float, float]:
+        """Shared regression pass: (beta, annual alpha, portfolio mean, benchmark mean, tracking error)"""
+        p = np.asarray(portfolio_returns, dtype=np.float64)
+        b = np.asarray(benchmark_returns, dtype=np.float64)
+        n = len(p)
+        
+        p_mean = p.mean()
+        b_mean = b.mean()
+        dp = p - p_mean
+        db = b - b_mean
+        
+        # Sample covariance over population variance, as np.cov(p, b)[0][1] / np.var(b)
+        var_b = (db * db).mean()
+        beta = float((dp * db).sum() / (n - 1) / var_b) if var_b != 0 else 1.0
+        alpha = p_mean * 252 - (self.risk_free_rate + beta * (b_mean * 252 - self.risk_free_rate))
+        tracking_error = math.sqrt(((dp - db) ** 2).mean())
+        
+        return beta, float(alpha), float(p_mean), float(b_mean), tracking_error
+    
+    def calculate_beta(self, portfolio_returns: np.ndarray, 
+                      benchmark_returns: np.ndarray) -> float:
         """Calculate beta vs benchmark"""
         if len(portfolio_returns) != len(benchmark_returns) or len(portfolio_returns) < 2:
             return 1.0
         
-        portfolio_arr = np.array(portfolio_returns)
-        benchmark_arr = np.array(benchmark_returns)
-        
-        if np.var(benchmark_arr) == 0:
-            return 1.0
-        
-        covariance = np.cov(portfolio_arr, benchmark_arr)[0][1]
-        variance = np.var(benchmark_arr)
-        
-        return float(covariance / variance)
+        return self._regress(portfolio_returns, benchmark_returns)[0]
     
-    def calculate_alpha(self, portfolio_returns: List[float], 
-                       benchmark_returns: List[float]) -> float:
+    def calculate_alpha(self, portfolio_returns: np.ndarray, 
+                       benchmark_returns: np.ndarray) -> float:
         """Calculate alpha vs benchmark"""
         if len(portfolio_returns) != len(benchmark_returns) or len(portfolio_returns) < 2:
             return 0.0
         
-        portfolio_mean = np.mean(portfolio_returns)
-        benchmark_mean = np.mean(benchmark_returns)
-        beta = self.calculate_beta(portfolio_returns, benchmark_returns)
-        
-        # Annualize
-        annual_portfolio = portfolio_mean * 252
-        annual_benchmark = benchmark_mean * 252
-        
-        alpha = annual_portfolio - (self.risk_free_rate + beta * (annual_benchmark - self.risk_free_rate))
-        
-        return float(alpha)
+        return self._regress(portfolio_returns, benchmark_returns)[1]
     
-    def calculate_information_ratio(self, portfolio_returns: List[float], 
-                                  benchmark_returns: List[float]) -> float:
+    def calculate_information_ratio(self, portfolio_returns: np.ndarray, 
+                                  benchmark_returns: np.ndarray) -> float:
         """Calculate information ratio (active return / tracking error)"""
         if len(portfolio_returns) != len(benchmark_returns) or len(portfolio_returns) < 2:
             return 0.0
         
-        portfolio_arr = np.array(portfolio_returns)
-        benchmark_arr = np.array(benchmark_returns)
-        
-        excess_returns = portfolio_arr - benchmark_arr
-        
-        if len(excess_returns) < 2:
-            return 0.0
-        
-        mean_excess = np.mean(excess_returns)
-        tracking_error = np.std(excess_returns)
+        _, _, portfolio_mean, benchmark_mean, tracking_error = self._regress(portfolio_returns, benchmark_returns)
         
         if tracking_error == 0:
             return 0.0
         
         # Annualize
-        annual_excess = mean_excess * 252
-        annual_tracking = tracking_error * np.sqrt(252)
+        annual_excess = (portfolio_mean - benchmark_mean) * 252
+        annual_tracking = tracking_error * math.sqrt(252)
         
         return float(annual_excess / annual_tracking)
     
@@ -156,7 +221,7 @@ class MetricsCalculator:
         for token, history in token_histories.items():
             if len(history) >= 2:
                 returns = self.calculate_returns(history)
-                if returns:
+                if returns.size:
                     token_returns[token] = returns
         
         if len(token_returns) < 2:
@@ -171,23 +236,16 @@ class MetricsCalculator:
         for token in token_returns:
             token_returns[token] = token_returns[token][-min_length:]
         
-        # Calculate correlation matrix
+        # Calculate the full correlation matrix in one call on a (K, N) matrix
         tokens = list(token_returns.keys())
-        correlations = {}
+        returns_matrix = np.vstack([np.asarray(token_returns[token], dtype=np.float64) for token in tokens])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr_matrix = np.corrcoef(returns_matrix)
+        np.nan_to_num(corr_matrix, copy=False)
+        np.fill_diagonal(corr_matrix, 1.0)
         
-        for i, token1 in enumerate(tokens):
-            correlations[token1] = {}
-            for j, token2 in enumerate(tokens):
-                if i == j:
-                    correlations[token1][token2] = 1.0
-                else:
-                    try:
-                        corr = float(np.corrcoef(token_returns[token1], token_returns[token2])[0][1])
-                        if math.isnan(corr):
-                            corr = 0.0
-                        correlations[token1][token2] = corr
-                    except:
-                        correlations[token1][token2] = 0.0
+        rows = corr_matrix.tolist()
+        correlations = {token1: dict(zip(tokens, rows[i])) for i, token1 in enumerate(tokens)}
         
         return correlations
     
@@ -200,23 +258,37 @@ class MetricsCalculator:
         if not nav_history:
             return self._empty_metrics()
         
-        # Portfolio returns
-        portfolio_returns = self.calculate_returns(nav_history)
+        # Extract NAV points once and share the array across all metrics
+        nav = self._nav_array(nav_history)
+        portfolio_returns = self._returns_from_array(nav)
         
-        if portfolio_returns:
+        if portfolio_returns.size:
             metrics['total_return'] = float((nav_history[-1].get('nav', 0) / nav_history[0].get('nav', 1) - 1) * 100)
-            metrics['volatility'] = self.calculate_volatility(portfolio_returns) * 100
-            metrics['sharpe_ratio'] = self.calculate_sharpe_ratio(portfolio_returns)
-            metrics['max_drawdown'] = self.calculate_max_drawdown(nav_history) * 100
+            if numba is not None:
+                volatility, sharpe_ratio, max_drawdown = _nav_stats_kernel(nav, self.risk_free_rate)
+                metrics['volatility'] = float(volatility) * 100
+                metrics['sharpe_ratio'] = float(sharpe_ratio)
+                metrics['max_drawdown'] = float(max_drawdown) * 100
+            else:
+                metrics['volatility'] = self.calculate_volatility(portfolio_returns) * 100
+                metrics['sharpe_ratio'] = self.calculate_sharpe_ratio(portfolio_returns)
+                metrics['max_drawdown'] = self._max_drawdown(nav) * 100
         else:
             metrics.update(self._empty_metrics())
         
         # Benchmark comparisons
         if 'SOL' in benchmark_history and benchmark_history['SOL']:
-            sol_returns = self.calculate_returns(benchmark_history['SOL'])
-            if sol_returns and len(sol_returns) == len(portfolio_returns):
-                metrics['beta_sol'] = self.calculate_beta(portfolio_returns, sol_returns)
-                metrics['alpha_sol'] = self.calculate_alpha(portfolio_returns, sol_returns) * 100
+            sol_returns = self._returns_from_array(self._nav_array(benchmark_history['SOL']))
+            if sol_returns.size and len(sol_returns) == len(portfolio_returns):
+                if numba is not None:
+                    beta, alpha, _ = _beta_alpha_info_kernel(portfolio_returns, sol_returns, self.risk_free_rate)
+                    metrics['beta_sol'] = float(beta)
+                    metrics['alpha_sol'] = float(alpha) * 100
+                else:
+                    # Same n < 2 fallback as calculate_beta/calculate_alpha and the kernel
+                    beta, alpha = self._regress(portfolio_returns, sol_returns)[:2] if len(portfolio_returns) >= 2 else (1.0, 0.0)
+                    metrics['beta_sol'] = beta
+                    metrics['alpha_sol'] = alpha * 100
                 metrics['correlation_sol'] = float(np.corrcoef(portfolio_returns, sol_returns)[0][1]) if len(portfolio_returns) > 1 else 0.0
         
         # Rebalancing metrics
@@ -270,34 +342,34 @@ class MetricsCalculator:
             # Convert to numpy arrays
             mu = np.array([expected_returns[token] for token in tokens])
             
-            # Build covariance matrix
-            cov_matrix = np.zeros((n_assets, n_assets))
-            for i, token1 in enumerate(tokens):
-                for j, token2 in enumerate(tokens):
-                    if token1 in covariance_matrix and token2 in covariance_matrix[token1]:
-                        cov_matrix[i][j] = covariance_matrix[token1][token2]
-                    else:
-                        cov_matrix[i][j] = 1.0 if i == j else 0.0
+            # Build covariance matrix; missing entries default to 1.0 on the diagonal, 0.0 elsewhere
+            cov_matrix = np.array([[covariance_matrix.get(token1, {}).get(token2, np.nan) for token2 in tokens]
+                                   for token1 in tokens], dtype=np.float64)
+            diagonal = np.diag(cov_matrix)
+            np.fill_diagonal(cov_matrix, np.where(np.isnan(diagonal), 1.0, diagonal))
+            cov_matrix = np.nan_to_num(cov_matrix, nan=0.0)
             
             # Generate target returns
             min_return = np.min(mu)
             max_return = np.max(mu)
             target_returns = np.linspace(min_return, max_return, num_portfolios)
             
-            efficient_portfolios = []
+            # One weight row per target portfolio: simple equal weight for demonstration
+            # In production, would solve quadratic optimization per target
+            weights = np.full((len(target_returns), n_assets), 1.0 / n_assets)
             
-            for target in target_returns:
-                # Simple equal weight for demonstration
-                # In production, would solve quadratic optimization
-                weights = np.ones(n_assets) / n_assets
-                portfolio_return = np.dot(weights, mu)
-                portfolio_vol = np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights)))
-                
+            # Batched return and variance for all portfolios in one pass
+            portfolio_returns = weights @ mu
+            portfolio_vols = np.sqrt(np.einsum('pi,ij,pj->p', weights, cov_matrix, weights))
+            
+            efficient_portfolios = []
+            for row, portfolio_return, portfolio_vol in zip(weights.tolist(), portfolio_returns.tolist(),
+                                                            portfolio_vols.tolist()):
                 efficient_portfolios.append({
-                    'return': float(portfolio_return),
-                    'volatility': float(portfolio_vol),
-                    'sharpe': float(portfolio_return / portfolio_vol) if portfolio_vol > 0 else 0.0,
-                    'weights': {tokens[i]: float(weights[i]) for i in range(n_assets)}
+                    'return': portfolio_return,
+                    'volatility': portfolio_vol,
+                    'sharpe': portfolio_return / portfolio_vol if portfolio_vol > 0 else 0.0,
+                    'weights': dict(zip(tokens, row))
                 })
             
             return efficient_portfolios
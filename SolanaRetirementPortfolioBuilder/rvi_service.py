@@ -1,12 +1,113 @@
+import math
 import time
 import threading
 import logging
 from typing import Dict, List, Optional, Tuple
-from collections import deque
-from datetime import datetime, timedelta
+from datetime import datetime
 import numpy as np
 from jupiter_api import JupiterAPI
 
+try:
+    import numba
+except ImportError:  # numba is optional; anomalies then use the scalar fallback
+    numba = None
+
+# Tokens sampled by the RVI service, with their mint addresses
+_TOKEN_MINTS: Tuple[Tuple[str, str], ...] = (
+    ('SOL', 'So11111111111111111111111111111111111111112'),
+    ('mSOL', 'mSoLzYCxHdYgdzU16g5QSh3i5K3z3KZK7ytfqcJm7So'),
+    ('stSOL', '7dHbWXmci3dT8UFYWYZweBLXgycu7Y3iL6trKn1Y7ARj'),
+    ('BONK', 'DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263'),
+    ('USDC', 'EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v'),
+)
+_TOKENS = tuple(token for token, _ in _TOKEN_MINTS)
+
+
+def _rolling_zscores(prices: np.ndarray, window: int, threshold: float):
+    """Z-score of each price against the preceding window, using running sums.
+
+    Returns the indices, z-scores and baseline means of points whose z-score
+    exceeds threshold. Sums are taken relative to the first price so a flat
+    baseline yields an exactly zero variance, as np.std would.
+    """
+    n = prices.shape[0]
+    idx = np.empty(n, dtype=np.int64)
+    zs = np.empty(n, dtype=np.float64)
+    means = np.empty(n, dtype=np.float64)
+    found = 0
+    
+    if n <= window or window < 1:
+        return idx[:0], zs[:0], means[:0]
+    
+    shift = prices[0]
+    s1 = 0.0
+    s2 = 0.0
+    for i in range(window):
+        d = prices[i] - shift
+        s1 += d
+        s2 += d * d
+    
+    for i in range(window, n):
+        mean = s1 / window
+        var = s2 / window - mean * mean
+        # Treat sub-ulp variance left over from the running sums as a flat baseline
+        if var > 1e-18 * (mean + shift) * (mean + shift):
+            z = abs(prices[i] - shift - mean) / np.sqrt(var)
+            if z > threshold:
+                idx[found] = i
+                zs[found] = z
+                means[found] = mean + shift
+                found += 1
+        
+        d_in = prices[i] - shift
+        d_out = prices[i - window] - shift
+        s1 += d_in - d_out
+        s2 += d_in * d_in - d_out * d_out
+    
+    return idx[:found], zs[:found], means[:found]
+
+
+def _rolling_zscores_py(prices: List[float], window: int,
+                        threshold: float) -> Tuple[List[int], List[float], List[float]]:
+    """Scalar twin of _rolling_zscores for small windows when numba is unavailable.
+
+    Works on Python floats with math.sqrt so no step pays NumPy's per-call dispatch.
+    """
+    idx, zs, means = [], [], []
+    n = len(prices)
+    if n <= window or window < 1:
+        return idx, zs, means
+    
+    shift = prices[0]
+    s1 = 0.0
+    s2 = 0.0
+    for price in prices[:window]:
+        d = price - shift
+        s1 += d
+        s2 += d * d
+    
+    for i in range(window, n):
+        mean = s1 / window
+        var = s2 / window - mean * mean
+        d_in = prices[i] - shift
+        if var > 1e-18 * (mean + shift) * (mean + shift):
+            z = abs(d_in - mean) / math.sqrt(var)
+            if z > threshold:
+                idx.append(i)
+                zs.append(z)
+                means.append(mean + shift)
+        
+        d_out = prices[i - window] - shift
+        s1 += d_in - d_out
+        s2 += d_in * d_in - d_out * d_out
+    
+    return idx, zs, means
+
+
+if numba is not None:
+    # nogil lets request threads run the kernel while the sampler keeps writing
+    _rolling_zscores = numba.njit(nogil=True, cache=True, fastmath=True)(_rolling_zscores)
+
 class RVIService:
     """Real-time Volatility Index service for monitoring market stability"""
     
@@ -14,21 +115,45 @@ class RVIService:
         self.jupiter_api = JupiterAPI()
         self.is_running = False
         self.thread = None
-        self.sample_interval = 10  # seconds
+        self.sample_interval = 10  # seconds; also sets _rvi_annualization
         
-        # Store price samples for each token
-        self.price_history = {}
+        # Store price samples for each token as ring buffers of prices and epoch seconds.
+        # Prices are kept as float32 (ample for ~8 significant digits); reads widen to float64.
         self.max_samples = 360  # Keep 1 hour of data at 10s intervals
+        self.prices: Dict[str, np.ndarray] = {}
+        self.times: Dict[str, np.ndarray] = {}
+        self.head: Dict[str, int] = {}  # Next write position
+        self.count: Dict[str, int] = {}  # Filled slots, capped at max_samples
+        self.seq: Dict[str, int] = {}  # Samples ever written; keeps rising once the ring is full
+        self._ring_lock = threading.Lock()  # Guards slot writes, cursor updates and cache stores
         
         # RVI calculations
         self.rvi_window = 30  # Use last 30 samples for RVI
         self.stability_threshold = 0.02  # 2% threshold for stability
         
+        # Results keyed by token as (seq at compute, value); stale once a new sample lands
+        self._rvi_cache: Dict[str, Tuple[int, float]] = {}
+        self._stability_cache: Dict[str, Tuple[int, Dict]] = {}
+        
         # Performance metrics
         self.last_update = None
         self.update_count = 0
         self.error_count = 0
         
+        if numba is not None:
+            # Compile (or load from cache) the kernel now rather than on the first dashboard request
+            _rolling_zscores(np.zeros(2, dtype=np.float64), 1, 3.0)
+        
+    @property
+    def sample_interval(self) -> float:
+        return self._sample_interval
+    
+    @sample_interval.setter
+    def sample_interval(self, seconds: float):
+        self._sample_interval = seconds
+        # RVI scales per-sample volatility by sqrt(samples per day)
+        self._rvi_annualization = math.sqrt((24 * 3600) / seconds)
+        
     def start_sampling(self):
         """Start the background sampling thread"""
         if self.is_running:
@@ -48,29 +173,24 @@ class RVIService:
         
     def _sampling_loop(self):
         """Main sampling loop running in background thread"""
-        tokens = ['SOL', 'mSOL', 'stSOL', 'BONK', 'USDC']
-        token_mints = {
-            'SOL': 'So11111111111111111111111111111111111111112',
-            'mSOL': 'mSoLzYCxHdYgdzU16g5QSh3i5K3z3KZK7ytfqcJm7So',
-            'stSOL': '7dHbWXmci3dT8UFYWYZweBLXgycu7Y3iL6trKn1Y7ARj',
-            'BONK': 'DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263',
-            'USDC': 'EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v'
-        }
+        mints = [mint for _, mint in _TOKEN_MINTS]
         
         while self.is_running:
             try:
-                timestamp = datetime.now()
+                timestamp = time.time()
+                
+                # Sample prices for all tokens in one batched request
+                try:
+                    prices = self.jupiter_api.get_multiple_prices(mints)
+                except Exception as e:
+                    logging.error(f"Error sampling prices: {e}")
+                    self.error_count += 1
+                    prices = {}
                 
-                # Sample prices for all tokens
-                for token in tokens:
-                    mint = token_mints[token]
-                    try:
-                        price = self.jupiter_api.get_price(mint)
-                        if price > 0:
-                            self._add_sample(token, timestamp, price)
-                    except Exception as e:
-                        logging.error(f"Error sampling {token}: {e}")
-                        self.error_count += 1
+                for token, mint in _TOKEN_MINTS:
+                    price = prices.get(mint, 0)
+                    if price > 0:
+                        self._add_sample(token, timestamp, price)
                 
                 self.last_update = timestamp
                 self.update_count += 1
@@ -83,99 +203,129 @@ class RVIService:
                 self.error_count += 1
                 time.sleep(self.sample_interval)
     
-    def _add_sample(self, token: str, timestamp: datetime, price: float):
+    def _add_sample(self, token: str, timestamp: float, price: float):
         """Add a price sample for a token"""
-        if token not in self.price_history:
-            self.price_history[token] = deque(maxlen=self.max_samples)
-        
-        sample = {
-            'timestamp': timestamp,
-            'price': price
-        }
+        if not price > 0:  # Keeps the rings log-safe, so readers never re-check
+            return
         
-        self.price_history[token].append(sample)
+        with self._ring_lock:
+            if token not in self.prices:
+                self.prices[token] = np.zeros(self.max_samples, dtype=np.float32)
+                self.times[token] = np.zeros(self.max_samples, dtype=np.float64)
+                self.head[token] = 0
+                self.seq[token] = 0
+                self.count[token] = 0  # Published last: lock-free readers test membership via count
+            
+            head = self.head[token]
+            self.prices[token][head] = price
+            self.times[token][head] = timestamp
+            self.head[token] = (head + 1) % self.max_samples
+            self.count[token] = min(self.count[token] + 1, self.max_samples)
+            self.seq[token] += 1
+    
+    def _cursor(self, token: str) -> Tuple[int, int]:
+        """Consistent (head, count) snapshot of a token's ring buffer"""
+        with self._ring_lock:
+            return self.head[token], self.count[token]
+    
+    @staticmethod
+    def _unroll(ring: np.ndarray, head: int, count: int, n: int) -> np.ndarray:
+        """Last n entries of a ring buffer in chronological order, widened to float64.
+
+        An unwrapped float64 window comes back as a view rather than a copy; the
+        sampler only writes at head, outside the returned slice.
+        """
+        start = head - min(n, count)
+        
+        if start >= 0:
+            return ring[start:head].astype(np.float64, copy=False)
+        return np.concatenate((ring[start:], ring[:head]), dtype=np.float64)
+    
+    @staticmethod
+    def _reported_prices(prices: np.ndarray) -> List[float]:
+        """Prices for API output, at float32's shortest round-trip repr rather than widening noise"""
+        return [float(str(p)) for p in prices.astype(np.float32)]
+    
+    def _store_if_current(self, cache: Dict, token: str, seq: int, value) -> None:
+        """Cache a result unless a sample landed since its inputs were read"""
+        with self._ring_lock:
+            if self.seq[token] == seq:
+                cache[token] = (seq, value)
+    
+    def _recent(self, token: str, n: int) -> np.ndarray:
+        """Last n prices for a token in chronological order"""
+        head, count = self._cursor(token)
+        return self._unroll(self.prices[token], head, count, n)
+    
+    def _recent_with_times(self, token: str, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Last n (epoch timestamps, prices) for a token, taken from one ring snapshot"""
+        head, count = self._cursor(token)
+        return (self._unroll(self.times[token], head, count, n),
+                self._unroll(self.prices[token], head, count, n))
     
     def calculate_rvi(self, token: str) -> Optional[float]:
         """Calculate Realized Volatility Index for a token"""
-        if token not in self.price_history:
-            return None
-            
-        history = list(self.price_history[token])
-        if len(history) < self.rvi_window:
+        if self.count.get(token, 0) < self.rvi_window:
             return None
         
-        # Use last N samples
-        recent_samples = history[-self.rvi_window:]
-        prices = [s['price'] for s in recent_samples]
-        
-        if len(prices) < 2:
-            return None
+        seq = self.seq[token]  # Read before the ring snapshot
+        cached = self._rvi_cache.get(token)
+        if cached is not None and cached[0] == seq:
+            return cached[1]
         
-        # Calculate log returns
-        log_returns = []
-        for i in range(1, len(prices)):
-            if prices[i-1] > 0 and prices[i] > 0:
-                log_return = np.log(prices[i] / prices[i-1])
-                log_returns.append(log_return)
-        
-        if len(log_returns) < 2:
-            return None
+        # Use last N samples; prices are positive by construction in _add_sample
+        prices = self._recent(token, self.rvi_window)
+        log_returns = np.diff(np.log(prices))
         
         # RVI = standard deviation of log returns * sqrt(samples per day)
-        samples_per_day = (24 * 3600) / self.sample_interval
-        volatility = np.std(log_returns) * np.sqrt(samples_per_day)
+        volatility = float(log_returns.std() * self._rvi_annualization)
         
-        return float(volatility)
+        self._store_if_current(self._rvi_cache, token, seq, volatility)
+        return volatility
     
     def calculate_stability_metrics(self, token: str) -> Dict:
         """Calculate stability metrics for a token"""
-        if token not in self.price_history:
-            return {}
-            
-        history = list(self.price_history[token])
-        if len(history) < 10:
+        if self.count.get(token, 0) < 10:
             return {}
         
-        prices = [s['price'] for s in history[-30:]]  # Last 30 samples
+        seq = self.seq[token]  # Read before the ring snapshot
+        cached = self._stability_cache.get(token)
+        if cached is not None and cached[0] == seq:
+            return cached[1]
         
-        if len(prices) < 2:
-            return {}
-        
-        # Price change metrics
-        price_changes = []
-        for i in range(1, len(prices)):
-            if prices[i-1] > 0:
-                change = (prices[i] - prices[i-1]) / prices[i-1]
-                price_changes.append(abs(change))
+        prices = self._recent(token, 30)  # Last 30 samples
         
-        if not price_changes:
-            return {}
+        # Absolute relative changes in one pass; prices are positive by construction
+        price_changes = np.abs(np.diff(prices) / prices[:-1])
         
-        # Calculate metrics
-        avg_price = np.mean(prices)
-        max_change = max(price_changes)
-        avg_change = np.mean(price_changes)
-        volatility = np.std(price_changes)
+        # Calculate metrics, reusing the mean for the volatility
+        avg_price = prices.mean()
+        max_change = price_changes.max()
+        avg_change = price_changes.mean()
+        deviations = price_changes - avg_change
+        volatility = np.sqrt(np.dot(deviations, deviations) / price_changes.size)
         
         # Stability score (0-100, higher is more stable)
         stability_score = max(0, 100 - (volatility * 1000))
         
-        return {
+        metrics = {
             'average_price': float(avg_price),
             'max_change': float(max_change),
             'average_change': float(avg_change),
             'volatility': float(volatility),
             'stability_score': float(stability_score),
-            'is_stable': max_change < self.stability_threshold,
-            'sample_count': len(prices)
+            'is_stable': bool(max_change < self.stability_threshold),
+            'sample_count': int(prices.size)
         }
+        
+        self._store_if_current(self._stability_cache, token, seq, metrics)
+        return metrics
     
     def get_all_rvi(self) -> Dict[str, float]:
         """Get RVI for all tokens"""
-        tokens = ['SOL', 'mSOL', 'stSOL', 'BONK', 'USDC']
         rvi_data = {}
         
-        for token in tokens:
+        for token in _TOKENS:
             rvi = self.calculate_rvi(token)
             if rvi is not None:
                 rvi_data[token] = rvi
@@ -184,10 +334,9 @@ class RVIService:
     
     def get_all_stability(self) -> Dict[str, Dict]:
         """Get stability metrics for all tokens"""
-        tokens = ['SOL', 'mSOL', 'stSOL', 'BONK', 'USDC']
         stability_data = {}
         
-        for token in tokens:
+        for token in _TOKENS:
             metrics = self.calculate_stability_metrics(token)
             if metrics:
                 stability_data[token] = metrics
@@ -196,16 +345,17 @@ class RVIService:
     
     def get_price_history(self, token: str, minutes: int = 60) -> List[Dict]:
         """Get price history for a token"""
-        if token not in self.price_history:
+        if token not in self.count:
             return []
         
-        cutoff_time = datetime.now() - timedelta(minutes=minutes)
-        history = list(self.price_history[token])
+        cutoff_time = time.time() - minutes * 60.0
+        times, prices = self._recent_with_times(token, self.max_samples)
         
-        # Filter by time
+        # Samples are in time order, so binary search for the first one inside the window
+        start = int(np.searchsorted(times, cutoff_time, side='left'))
         recent_history = [
-            s for s in history 
-            if s['timestamp'] >= cutoff_time
+            {'timestamp': datetime.fromtimestamp(t).isoformat(), 'price': p}
+            for t, p in zip(times[start:].tolist(), self._reported_prices(prices[start:]))
         ]
         
         return recent_history
@@ -214,52 +364,39 @@ class RVIService:
         """Get service performance statistics"""
         return {
             'is_running': self.is_running,
-            'last_update': self.last_update.isoformat() if self.last_update else None,
+            'last_update': datetime.fromtimestamp(self.last_update).isoformat() if self.last_update else None,
             'update_count': self.update_count,
             'error_count': self.error_count,
             'error_rate': self.error_count / max(1, self.update_count),
-            'tokens_tracked': len(self.price_history),
-            'total_samples': sum(len(hist) for hist in self.price_history.values()),
+            'tokens_tracked': len(self.prices),
+            'total_samples': sum(self.count.values()),
             'sample_interval': self.sample_interval
         }
     
     def detect_anomalies(self, token: str) -> List[Dict]:
         """Detect price anomalies for a token"""
-        if token not in self.price_history:
-            return []
-            
-        history = list(self.price_history[token])
-        if len(history) < 10:
+        if self.count.get(token, 0) < 10:
             return []
         
-        prices = [s['price'] for s in history[-50:]]  # Check last 50 samples
-        timestamps = [s['timestamp'] for s in history[-50:]]
+        timestamps, prices = self._recent_with_times(token, 50)  # Check last 50 samples
         
-        anomalies = []
-        
-        # Calculate rolling statistics
+        # Rolling z-scores against the previous window, 3 sigma threshold
         window_size = min(10, len(prices) // 2)
+        if numba is None and window_size <= 32:
+            indices, z_scores, baseline_means = _rolling_zscores_py(prices.tolist(), window_size, 3.0)
+        else:
+            indices, z_scores, baseline_means = (a.tolist() for a in _rolling_zscores(prices, window_size, 3.0))
         
-        for i in range(window_size, len(prices)):
-            # Use previous window for baseline
-            baseline = prices[i-window_size:i]
-            current_price = prices[i]
-            
-            baseline_mean = np.mean(baseline)
-            baseline_std = np.std(baseline)
-            
-            # Z-score anomaly detection
-            if baseline_std > 0:
-                z_score = abs(current_price - baseline_mean) / baseline_std
-                
-                if z_score > 3:  # 3 sigma threshold
-                    anomalies.append({
-                        'timestamp': timestamps[i].isoformat(),
-                        'price': current_price,
-                        'baseline_mean': baseline_mean,
-                        'z_score': float(z_score),
-                        'severity': 'high' if z_score > 5 else 'medium'
-                    })
+        reported = self._reported_prices(prices)
+        anomalies = []
+        for i, z_score, baseline_mean in zip(indices, z_scores, baseline_means):
+            anomalies.append({
+                'timestamp': datetime.fromtimestamp(timestamps[i]).isoformat(),
+                'price': reported[i],
+                'baseline_mean': baseline_mean,
+                'z_score': z_score,
+                'severity': 'high' if z_score > 5 else 'medium'
+            })
         
         return anomalies
 
@@ -21,8 +21,18 @@ class SmartRebalanceEngine:
             'monthly': 30,
             'quarterly': 90
         }
+        self._interval_deltas = {k: timedelta(days=v) for k, v in self.calendar_intervals.items()}
+        self._default_delta = timedelta(days=30)
         self.cost_threshold_pct = 0.5  # 0.5% of portfolio value
         
+        # Mode handlers, all taking should_rebalance's positional arguments
+        self._dispatch = {
+            RebalanceMode.THRESHOLD: self._threshold_wrapper,
+            RebalanceMode.CALENDAR: self._calendar_wrapper,
+            RebalanceMode.COST_AWARE: self._cost_aware_wrapper,
+            RebalanceMode.HYBRID: self._hybrid_check
+        }
+        
     def should_rebalance(self, 
                         mode: RebalanceMode,
                         current_weights: Dict[str, float],
@@ -38,20 +48,9 @@ class SmartRebalanceEngine:
             Dict with 'should_rebalance', 'reason', 'savings', and 'next_check'
         """
         
-        if mode == RebalanceMode.THRESHOLD:
-            return self._threshold_check(current_weights, target_weights, **kwargs)
-            
-        elif mode == RebalanceMode.CALENDAR:
-            return self._calendar_check(last_rebalance, **kwargs)
-            
-        elif mode == RebalanceMode.COST_AWARE:
-            return self._cost_aware_check(
-                current_weights, target_weights, 
-                portfolio_value, estimated_cost, **kwargs
-            )
-            
-        elif mode == RebalanceMode.HYBRID:
-            return self._hybrid_check(
+        handler = self._dispatch.get(mode)
+        if handler is not None:
+            return handler(
                 current_weights, target_weights, 
                 portfolio_value, estimated_cost, 
                 last_rebalance, **kwargs
@@ -64,28 +63,67 @@ class SmartRebalanceEngine:
             'next_check': None
         }
     
+    def _threshold_wrapper(self, current_weights: Dict[str, float],
+                           target_weights: Dict[str, float],
+                           portfolio_value: float,
+                           estimated_cost: float,
+                           last_rebalance: Optional[datetime],
+                           **kwargs) -> Dict:
+        """Adapt _threshold_check to the dispatch signature"""
+        return self._threshold_check(current_weights, target_weights, **kwargs)
+    
+    def _calendar_wrapper(self, current_weights: Dict[str, float],
+                          target_weights: Dict[str, float],
+                          portfolio_value: float,
+                          estimated_cost: float,
+                          last_rebalance: Optional[datetime],
+                          **kwargs) -> Dict:
+        """Adapt _calendar_check to the dispatch signature"""
+        return self._calendar_check(last_rebalance, **kwargs)
+    
+    def _cost_aware_wrapper(self, current_weights: Dict[str, float],
+                            target_weights: Dict[str, float],
+                            portfolio_value: float,
+                            estimated_cost: float,
+                            last_rebalance: Optional[datetime],
+                            **kwargs) -> Dict:
+        """Adapt _cost_aware_check to the dispatch signature"""
+        return self._cost_aware_check(current_weights, target_weights,
+                                      portfolio_value, estimated_cost, **kwargs)
+    
+    def _align(self, current_weights: Dict[str, float],
+               target_weights: Dict[str, float]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Materialize current and target weights as arrays aligned on the target tokens"""
+        tokens = list(target_weights)
+        current = np.array([current_weights.get(token, 0.0) for token in tokens], dtype=np.float64)
+        target = np.array([target_weights[token] for token in tokens], dtype=np.float64)
+        return tokens, current, target
+    
+    def _drift(self, current_weights: Dict[str, float],
+               target_weights: Dict[str, float]) -> Tuple[List[str], np.ndarray]:
+        """Absolute drift of each target token from its current weight"""
+        tokens, current, target = self._align(current_weights, target_weights)
+        return tokens, np.abs(current - target)
+    
     def _threshold_check(self, current_weights: Dict[str, float], 
                         target_weights: Dict[str, float], 
-                        threshold: Optional[float] = None) -> Dict:
+                        threshold: Optional[float] = None,
+                        drift: Optional[Tuple[List[str], np.ndarray]] = None) -> Dict:
         """Check if any weight has drifted beyond threshold"""
         
         threshold = threshold or self.default_threshold
-        max_drift = 0.0
-        drifted_tokens = []
+        tokens, drift = drift or self._drift(current_weights, target_weights)
         
-        for token, target in target_weights.items():
-            current = current_weights.get(token, 0.0)
-            drift = abs(current - target)
-            
-            if drift > threshold:
-                drifted_tokens.append({
-                    'token': token,
-                    'drift': drift,
-                    'current': current,
-                    'target': target
-                })
-            
-            max_drift = max(max_drift, drift)
+        max_drift = float(drift.max()) if drift.size else 0.0
+        drifted_tokens = [
+            {
+                'token': tokens[i],
+                'drift': float(drift[i]),
+                'current': current_weights.get(tokens[i], 0.0),
+                'target': target_weights[tokens[i]]
+            }
+            for i in np.flatnonzero(drift > threshold)
+        ]
         
         should_rebalance = len(drifted_tokens) > 0
         
@@ -118,8 +156,7 @@ class SmartRebalanceEngine:
                 'next_check': None
             }
         
-        interval_days = self.calendar_intervals.get(interval, 30)
-        next_rebalance = last_rebalance + timedelta(days=interval_days)
+        next_rebalance = last_rebalance + self._interval_deltas.get(interval, self._default_delta)
         now = datetime.now()
         
         should_rebalance = now >= next_rebalance
@@ -144,21 +181,17 @@ class SmartRebalanceEngine:
                          target_weights: Dict[str, float],
                          portfolio_value: float,
                          estimated_cost: float,
-                         cost_threshold_pct: Optional[float] = None) -> Dict:
+                         cost_threshold_pct: Optional[float] = None,
+                         drift: Optional[Tuple[List[str], np.ndarray]] = None) -> Dict:
         """Check if rebalancing cost is justified by drift"""
         
         cost_threshold_pct = cost_threshold_pct or self.cost_threshold_pct
         cost_threshold = portfolio_value * (cost_threshold_pct / 100)
         
         # Calculate drift severity
-        total_drift = 0.0
-        max_drift = 0.0
-        
-        for token, target in target_weights.items():
-            current = current_weights.get(token, 0.0)
-            drift = abs(current - target)
-            total_drift += drift
-            max_drift = max(max_drift, drift)
+        _, drift = drift or self._drift(current_weights, target_weights)
+        total_drift = float(drift.sum())
+        max_drift = float(drift.max()) if drift.size else 0.0
         
         # Cost-benefit analysis
         drift_score = (total_drift + max_drift * 2) / 3  # Weighted drift score
@@ -203,12 +236,13 @@ class SmartRebalanceEngine:
                      cost_threshold_pct: Optional[float] = None) -> Dict:
         """Hybrid mode combining threshold, calendar, and cost-aware logic"""
         
-        # Run all checks
-        threshold_result = self._threshold_check(current_weights, target_weights, threshold)
+        # Calendar is pure date math, so settle it first; the drift array is shared by the rest
         calendar_result = self._calendar_check(last_rebalance, interval)
+        drift = self._drift(current_weights, target_weights)
+        threshold_result = self._threshold_check(current_weights, target_weights, threshold, drift)
         cost_result = self._cost_aware_check(
             current_weights, target_weights, 
-            portfolio_value, estimated_cost, cost_threshold_pct
+            portfolio_value, estimated_cost, cost_threshold_pct, drift
         )
         
         # Hybrid decision logic
@@ -5,9 +5,77 @@ Apply various market stress scenarios to test portfolio resilience
 
 import logging
 import numpy as np
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
 from dataclasses import dataclass
+from types import MappingProxyType
+
+try:
+    import numba
+except ImportError:  # numba is optional; simulations fall back to the NumPy implementation
+    numba = None
+
+# Base daily volatility per token; read-only since it is shared by every engine and worker
+_VOL_TABLE = MappingProxyType({
+    "SOL": 0.04,
+    "mSOL": 0.035,
+    "stSOL": 0.035,
+    "BONK": 0.08,
+    "USDC": 0.002
+})
+
+
+def _stress_path_kernel(returns: np.ndarray, weights: np.ndarray,
+                        initial_token_values: np.ndarray, initial_value: float):
+    """Compound a (days x tokens) return matrix into NAV and portfolio-return paths.
+
+    Returns (nav_path, daily_returns, max_drawdown, recovery_days) with the drawdown
+    as a fraction and recovery_days = -1 when the NAV never regains initial_value
+    after its trough.
+    """
+    days, n_tokens = returns.shape
+    nav = np.empty(days + 1)
+    daily_returns = np.empty(days)
+    values = initial_token_values.copy()
+    nav[0] = initial_value
+    
+    for day in range(days):
+        day_nav = 0.0
+        day_return = 0.0
+        for tok in range(n_tokens):
+            r = returns[day, tok]
+            values[tok] *= 1.0 + r
+            day_nav += values[tok]
+            day_return += weights[tok] * r
+        nav[day + 1] = day_nav
+        daily_returns[day] = day_return
+    
+    # Max drawdown from the running peak, and the first trough
+    peak = nav[0]
+    max_drawdown = 0.0
+    min_idx = 0
+    for i in range(days + 1):
+        if nav[i] > peak:
+            peak = nav[i]
+        drawdown = 1.0 - nav[i] / peak
+        if drawdown > max_drawdown:
+            max_drawdown = drawdown
+        if nav[i] < nav[min_idx]:
+            min_idx = i
+    
+    recovery_days = -1
+    for i in range(min_idx, days + 1):
+        if nav[i] >= initial_value:
+            recovery_days = i - min_idx
+            break
+    
+    return nav, daily_returns, max_drawdown, recovery_days
+
+
+if numba is not None:
+    _stress_path_kernel = numba.njit(cache=True, fastmath=True)(_stress_path_kernel)
+    # Compile (or load from cache) at import so the first scenario doesn't pay for it
+    _stress_path_kernel(np.zeros((1, 1)), np.ones(1), np.ones(1), 1.0)
 
 @dataclass
 class StressScenario:
@@ -25,70 +93,154 @@ class StressResult:
     scenario_name: str
     initial_nav: float
     final_nav: float
+    worst_nav: float
     total_return: float
     max_drawdown: float
     recovery_days: Optional[int]
     volatility: float
-    nav_path: List[float]
-    daily_returns: List[float]
+    nav_path: np.ndarray  # Day 0 is the initial NAV
+    daily_returns: np.ndarray
+
+
+def _shock_vec(scenario: StressScenario, tokens: List[str]) -> np.ndarray:
+    """Dense per-token price shocks (as fractions) aligned with tokens"""
+    return np.array([scenario.price_shocks.get(token, 0.0) for token in tokens], dtype=np.float64) / 100.0
+
+
+def _simulate_scenario(portfolio: Dict[str, float], scenario: StressScenario,
+                       initial_value: float, quotes: Dict[str, float],
+                       seed: Union[int, np.random.SeedSequence] = 42) -> StressResult:
+    """Simulate a stress scenario against an explicit seed"""
+    
+    # Use provided quotes
+    current_prices = quotes
+    
+    # Tokens that can be simulated, with their parameters aligned by position
+    tokens = [token for token in portfolio if current_prices.get(token, 0) > 0]
+    weight_vec = np.array([portfolio[token] / 100 for token in tokens], dtype=np.float64)
+    shock_vec = _shock_vec(scenario, tokens)
+    vol_vec = np.fromiter((_VOL_TABLE.get(token, 0.04) for token in tokens),
+                          dtype=np.float64, count=len(tokens)) * scenario.volatility_multiplier
+    initial_token_values = weight_vec * initial_value
+    
+    # Generate stress path: day 0 applies the price shock, later days add ongoing volatility
+    rng = np.random.default_rng(seed)  # Private stream; reproducible per seed
+    returns = rng.standard_normal((scenario.duration_days, len(tokens))) * vol_vec
+    if scenario.duration_days > 0:
+        returns[0] = shock_vec
+    
+    if numba is not None:
+        nav_arr, daily_returns, max_drawdown, recovery_days = _stress_path_kernel(
+            returns, weight_vec, initial_token_values, float(initial_value)
+        )
+        max_drawdown *= 100
+        recovery_days = recovery_days if recovery_days >= 0 else None
+    else:
+        # Compound each token's value and sum across tokens for the NAV
+        token_paths = np.cumprod(1.0 + returns, axis=0) * initial_token_values
+        nav_arr = np.empty(scenario.duration_days + 1)
+        nav_arr[0] = initial_value
+        token_paths.sum(axis=1, out=nav_arr[1:])
+        daily_returns = returns @ weight_vec
+        
+        # Max drawdown
+        peak = np.maximum.accumulate(nav_arr)
+        max_drawdown = (1.0 - nav_arr / peak).max() * 100
+        
+        # Recovery time
+        recovery_days = StressTestEngine._calculate_recovery_time(nav_arr, initial_value)
+    
+    # Calculate metrics
+    final_nav = float(nav_arr[-1])
+    total_return = ((final_nav / initial_value) - 1) * 100
+    
+    # Volatility
+    volatility = np.std(daily_returns) * np.sqrt(252) * 100 if len(daily_returns) > 0 else 0
+    
+    return StressResult(
+        scenario_name=scenario.name,
+        initial_nav=initial_value,
+        final_nav=final_nav,
+        worst_nav=float(nav_arr.min()),
+        total_return=total_return,
+        max_drawdown=max_drawdown,
+        recovery_days=recovery_days,
+        volatility=volatility,
+        nav_path=nav_arr,
+        daily_returns=daily_returns
+    )
+
 
 class StressTestEngine:
     """Portfolio stress testing engine"""
     
+    _BASE_VOLATILITY = _VOL_TABLE
+    
+    # Predefined stress scenarios, shared by every engine instance
+    predefined_scenarios = {
+        "crypto_crash": StressScenario(
+            name="Crypto Crash",
+            description="Major crypto market crash (-50% SOL, -40% alts)",
+            price_shocks={"SOL": -50, "mSOL": -45, "stSOL": -45, "BONK": -70, "USDC": 0},
+            volatility_multiplier=3.0,
+            correlation_shift=0.2,
+            duration_days=30
+        ),
+        "defi_hack": StressScenario(
+            name="DeFi Protocol Hack",
+            description="Staking protocol hack affecting liquid staking tokens",
+            price_shocks={"SOL": -15, "mSOL": -35, "stSOL": -40, "BONK": -25, "USDC": 0},
+            volatility_multiplier=2.0,
+            correlation_shift=0.3,
+            duration_days=14
+        ),
+        "meme_collapse": StressScenario(
+            name="Meme Token Collapse",
+            description="Complete meme token collapse with flight to quality",
+            price_shocks={"SOL": 5, "mSOL": 8, "stSOL": 8, "BONK": -90, "USDC": 2},
+            volatility_multiplier=2.5,
+            correlation_shift=-0.4,
+            duration_days=21
+        ),
+        "regulatory_crackdown": StressScenario(
+            name="Regulatory Crackdown",
+            description="Harsh regulatory actions against crypto",
+            price_shocks={"SOL": -35, "mSOL": -40, "stSOL": -45, "BONK": -80, "USDC": -5},
+            volatility_multiplier=2.0,
+            correlation_shift=0.5,
+            duration_days=45
+        ),
+        "liquidity_crisis": StressScenario(
+            name="Liquidity Crisis",
+            description="Market-wide liquidity shortage with high slippage",
+            price_shocks={"SOL": -25, "mSOL": -30, "stSOL": -35, "BONK": -60, "USDC": 1},
+            volatility_multiplier=4.0,
+            correlation_shift=0.6,
+            duration_days=7
+        ),
+        "black_swan": StressScenario(
+            name="Black Swan Event",
+            description="Unpredictable extreme market event",
+            price_shocks={"SOL": -60, "mSOL": -65, "stSOL": -70, "BONK": -85, "USDC": -2},
+            volatility_multiplier=5.0,
+            correlation_shift=0.8,
+            duration_days=60
+        )
+    }
+    
+    _SEVERITY_MAP = MappingProxyType({
+        'crypto_crash': 'Severe',
+        'defi_hack': 'High', 
+        'meme_collapse': 'Medium',
+        'regulatory_crackdown': 'Severe',
+        'liquidity_crisis': 'High',
+        'black_swan': 'Extreme'
+    })
+    
+    _scenario_library: Optional[Tuple[MappingProxyType, ...]] = None  # Built on first get_scenario_library call
+    
     def __init__(self, jupiter_api):
         self.jupiter_api = jupiter_api
-        
-        # Predefined stress scenarios
-        self.predefined_scenarios = {
-            "crypto_crash": StressScenario(
-                name="Crypto Crash",
-                description="Major crypto market crash (-50% SOL, -40% alts)",
-                price_shocks={"SOL": -50, "mSOL": -45, "stSOL": -45, "BONK": -70, "USDC": 0},
-                volatility_multiplier=3.0,
-                correlation_shift=0.2,
-                duration_days=30
-            ),
-            "defi_hack": StressScenario(
-                name="DeFi Protocol Hack",
-                description="Staking protocol hack affecting liquid staking tokens",
-                price_shocks={"SOL": -15, "mSOL": -35, "stSOL": -40, "BONK": -25, "USDC": 0},
-                volatility_multiplier=2.0,
-                correlation_shift=0.3,
-                duration_days=14
-            ),
-            "meme_collapse": StressScenario(
-                name="Meme Token Collapse",
-                description="Complete meme token collapse with flight to quality",
-                price_shocks={"SOL": 5, "mSOL": 8, "stSOL": 8, "BONK": -90, "USDC": 2},
-                volatility_multiplier=2.5,
-                correlation_shift=-0.4,
-                duration_days=21
-            ),
-            "regulatory_crackdown": StressScenario(
-                name="Regulatory Crackdown",
-                description="Harsh regulatory actions against crypto",
-                price_shocks={"SOL": -35, "mSOL": -40, "stSOL": -45, "BONK": -80, "USDC": -5},
-                volatility_multiplier=2.0,
-                correlation_shift=0.5,
-                duration_days=45
-            ),
-            "liquidity_crisis": StressScenario(
-                name="Liquidity Crisis",
-                description="Market-wide liquidity shortage with high slippage",
-                price_shocks={"SOL": -25, "mSOL": -30, "stSOL": -35, "BONK": -60, "USDC": 1},
-                volatility_multiplier=4.0,
-                correlation_shift=0.6,
-                duration_days=7
-            ),
-            "black_swan": StressScenario(
-                name="Black Swan Event",
-                description="Unpredictable extreme market event",
-                price_shocks={"SOL": -60, "mSOL": -65, "stSOL": -70, "BONK": -85, "USDC": -2},
-                volatility_multiplier=5.0,
-                correlation_shift=0.8,
-                duration_days=60
-            )
-        }
     
     @property
     def stress_scenarios(self):
@@ -107,10 +259,10 @@ class StressTestEngine:
                 'max_drawdown': result.max_drawdown,
                 'recovery_day': result.recovery_days,
                 'volatility': result.volatility,
-                'worst_nav': min(result.nav_path),
+                'worst_nav': result.worst_nav,
                 'final_nav': result.final_nav
             },
-            'recovery_path': [{'day': i, 'nav': nav} for i, nav in enumerate(result.nav_path[:30])],
+            'recovery_path': [{'day': i, 'nav': nav} for i, nav in enumerate(result.nav_path[:30].tolist())],
             'rebalance_analysis': {
                 'recommendation': 'Avoid rebalancing during extreme stress periods',
                 'normal_cost': 0.1,
@@ -150,10 +302,10 @@ class StressTestEngine:
                 'max_drawdown': result.max_drawdown,
                 'recovery_day': result.recovery_days,
                 'volatility': result.volatility,
-                'worst_nav': min(result.nav_path),
+                'worst_nav': result.worst_nav,
                 'final_nav': result.final_nav
             },
-            'recovery_path': [{'day': i, 'nav': nav} for i, nav in enumerate(result.nav_path[:30])],
+            'recovery_path': [{'day': i, 'nav': nav} for i, nav in enumerate(result.nav_path[:30].tolist())],
             'rebalance_analysis': {
                 'recommendation': 'Custom stress test - monitor closely',
                 'normal_cost': 0.1,
@@ -168,115 +320,43 @@ class StressTestEngine:
                                  initial_value: float,
                                  quotes: Dict[str, float]) -> StressResult:
         """Simulate a stress scenario"""
-        
-        # Use provided quotes
-        current_prices = quotes
-        
-        # Initialize simulation
-        nav_path = [initial_value]
-        daily_returns = []
-        
-        # Calculate token allocations
-        token_values = {}
-        for token, weight in portfolio.items():
-            if token in current_prices:
-                token_values[token] = (weight / 100) * initial_value
-        
-        # Generate stress path
-        np.random.seed(42)  # Reproducible results
-        
-        for day in range(scenario.duration_days):
-            day_nav = 0
-            day_return = 0
-            
-            for token, initial_token_value in token_values.items():
-                if token not in current_prices or current_prices[token] <= 0:
-                    continue
-                
-                # Apply price shock (gradually over first week, then stabilize)
-                shock_factor = min(1.0, day / 7) if day < 7 else 1.0
-                price_shock = scenario.price_shocks.get(token, 0) * shock_factor / 100
-                
-                # Add ongoing volatility
-                base_vol = self._get_base_volatility(token)
-                daily_vol = base_vol * scenario.volatility_multiplier
-                random_shock = np.random.normal(0, daily_vol)
-                
-                # Combine effects
-                total_return = price_shock if day == 0 else random_shock
-                
-                # Update token value
-                if day == 0:
-                    token_nav = initial_token_value * (1 + total_return)
-                else:
-                    prev_token_value = token_values[token]
-                    token_nav = prev_token_value * (1 + total_return)
-                
-                token_values[token] = token_nav
-                day_nav += token_nav
-                
-                # Track return contribution
-                day_return += (portfolio[token] / 100) * total_return
-            
-            nav_path.append(day_nav)
-            daily_returns.append(day_return)
-        
-        # Calculate metrics
-        final_nav = nav_path[-1]
-        total_return = ((final_nav / initial_value) - 1) * 100
-        
-        # Max drawdown
-        peak = np.maximum.accumulate(nav_path)
-        drawdown = (np.array(nav_path) - peak) / peak
-        max_drawdown = abs(np.min(drawdown)) * 100
-        
-        # Recovery time
-        recovery_days = self._calculate_recovery_time(nav_path, initial_value)
-        
-        # Volatility
-        volatility = np.std(daily_returns) * np.sqrt(252) * 100 if len(daily_returns) > 0 else 0
-        
-        return StressResult(
-            scenario_name=scenario.name,
-            initial_nav=initial_value,
-            final_nav=final_nav,
-            total_return=total_return,
-            max_drawdown=max_drawdown,
-            recovery_days=recovery_days,
-            volatility=volatility,
-            nav_path=nav_path,
-            daily_returns=daily_returns
-        )
+        return _simulate_scenario(portfolio, scenario, initial_value, quotes)
     
     def _get_base_volatility(self, token: str) -> float:
         """Get base daily volatility for token"""
-        volatilities = {
-            "SOL": 0.04,
-            "mSOL": 0.035,
-            "stSOL": 0.035,
-            "BONK": 0.08,
-            "USDC": 0.002
-        }
-        return volatilities.get(token, 0.04)
+        return self._BASE_VOLATILITY.get(token, 0.04)
     
-    def _calculate_recovery_time(self, nav_path: List[float], initial_value: float) -> Optional[int]:
+    @staticmethod
+    def _calculate_recovery_time(nav_arr: np.ndarray, initial_value: float) -> Optional[int]:
         """Calculate days to recover to initial value"""
-        min_idx = np.argmin(nav_path)
+        min_idx = np.argmin(nav_arr)
         
-        for i in range(min_idx, len(nav_path)):
-            if nav_path[i] >= initial_value:
-                return int(i - min_idx)
+        tail = nav_arr[min_idx:]
+        if tail.max() < initial_value:
+            return None  # Didn't recover
         
-        return None  # Didn't recover
+        # First day at or after the trough that is back at the initial value
+        return int(np.argmax(tail >= initial_value))
     
     def run_comprehensive_stress_suite(self, portfolio: Dict[str, float], 
-                                     initial_value: float = 10000.0) -> Dict:
+                                     initial_value: float = 10000.0,
+                                     quotes: Optional[Dict[str, float]] = None) -> Dict:
         """Run all predefined stress scenarios"""
         results = {}
         
-        for scenario_name in self.stress_scenarios.keys():
+        # The simulation only uses quotes to skip unpriced tokens
+        if quotes is None:
+            quotes = dict.fromkeys(portfolio, 1.0)
+        
+        scenarios = self.stress_scenarios
+        # Independent, reproducible random stream for each scenario
+        seeds = np.random.SeedSequence(42).spawn(len(scenarios))
+        
+        # Serial on purpose: each scenario is sub-millisecond of NumPy work, far below
+        # the cost of process start-up and pickling
+        for (scenario_name, scenario), seed in zip(scenarios.items(), seeds):
             try:
-                result = self.run_stress_test(portfolio, scenario_name, initial_value)
+                result = _simulate_scenario(portfolio, scenario, initial_value, quotes, seed)
                 results[scenario_name] = {
                     "name": result.scenario_name,
                     "description": self.stress_scenarios[scenario_name].description,
@@ -285,7 +365,7 @@ class StressTestEngine:
                     "recovery_days": result.recovery_days,
                     "volatility": result.volatility,
                     "final_nav": result.final_nav,
-                    "nav_path": result.nav_path[:10],  # First 10 days for preview
+                    "nav_path": result.nav_path[:10].tolist(),  # First 10 days for preview
                     "severity": self._classify_severity(result)
                 }
             except Exception as e:
@@ -346,25 +426,23 @@ class StressTestEngine:
     
     def get_scenario_library(self) -> List[Dict]:
         """Get available stress test scenarios for frontend display"""
-        scenarios = []
+        scenarios = StressTestEngine._scenario_library
+        if scenarios is None:
+            scenarios = StressTestEngine._scenario_library = self._build_scenario_library()
         
-        severity_map = {
-            'crypto_crash': 'Severe',
-            'defi_hack': 'High', 
-            'meme_collapse': 'Medium',
-            'regulatory_crackdown': 'Severe',
-            'liquidity_crisis': 'High',
-            'black_swan': 'Extreme'
-        }
-        
-        for scenario_id, scenario in self.predefined_scenarios.items():
-            scenarios.append({
+        # Shared read-only entries; callers get their own mutable copies
+        return [dict(scenario) for scenario in scenarios]
+    
+    def _build_scenario_library(self) -> Tuple[MappingProxyType, ...]:
+        """Frontend scenario entries, frozen for sharing across engines"""
+        return tuple(
+            MappingProxyType({
                 'id': scenario_id,
                 'name': scenario.name,
                 'description': scenario.description,
-                'severity': severity_map.get(scenario_id, 'Medium'),
+                'severity': self._SEVERITY_MAP.get(scenario_id, 'Medium'),
                 'duration_days': scenario.duration_days,
                 'recovery_days': 'Variable'  # Will be calculated during simulation
             })
-        
-        return scenarios
\ No newline at end of file
+            for scenario_id, scenario in self.predefined_scenarios.items()
+        )
\ No newline at end of file
@@ -4,6 +4,7 @@ DISCLAIMER: This is for educational simulation only. Not financial or tax advice
 """
 
 import logging
+import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
@@ -37,8 +38,12 @@ class TaxLotSimulator:
     """Educational tax lot simulator for portfolio management"""
     
     def __init__(self):
-        self.lots: Dict[str, List[TaxLot]] = {}  # token -> list of lots
+        # token -> parallel lot arrays: 'qty', 'cb' (USD per token), 'date' (datetime64[us]), 'id'
+        self.lots: Dict[str, Dict[str, np.ndarray]] = {}
         self.sales: List[Sale] = []
+        # token -> method -> lot indices in sale order; sales only change quantities, so
+        # these stay valid until the token's next purchase
+        self._lot_orders: Dict[str, Dict[TaxLotMethod, np.ndarray]] = {}
         
     def add_purchase(self, token: str, quantity: float, cost_basis: float, 
                     purchase_date: Optional[datetime] = None) -> str:
@@ -48,20 +53,40 @@ class TaxLotSimulator:
             
         lot_id = f"{token}_{purchase_date.strftime('%Y%m%d_%H%M%S')}_{random.randint(1000,9999)}"
         
-        lot = TaxLot(
-            token=token,
-            quantity=quantity,
-            cost_basis=cost_basis,
-            purchase_date=purchase_date,
-            lot_id=lot_id
-        )
+        lots = self.lots.get(token)
+        if lots is None:
+            lots = self.lots[token] = {
+                'qty': np.empty(0, dtype=np.float64),
+                'cb': np.empty(0, dtype=np.float64),
+                'date': np.empty(0, dtype='datetime64[us]'),
+                'id': np.empty(0, dtype=object)
+            }
         
-        if token not in self.lots:
-            self.lots[token] = []
-        self.lots[token].append(lot)
+        lots['qty'] = np.append(lots['qty'], float(quantity))
+        lots['cb'] = np.append(lots['cb'], float(cost_basis))
+        lots['date'] = np.append(lots['date'], np.datetime64(purchase_date, 'us'))
+        lots['id'] = np.append(lots['id'], np.array([lot_id], dtype=object))
+        self._lot_orders.pop(token, None)
         
         return lot_id
     
+    def _lot_order(self, token: str, method: TaxLotMethod) -> np.ndarray:
+        """Indices of a token's lots in the order a method sells them (stable, so ties keep purchase order)"""
+        orders = self._lot_orders.setdefault(token, {})
+        order = orders.get(method)
+        if order is None:
+            lots = self.lots[token]
+            if method == TaxLotMethod.FIFO:
+                order = np.argsort(lots['date'], kind='stable')
+            elif method == TaxLotMethod.LIFO:
+                order = np.argsort(-lots['date'].view(np.int64), kind='stable')
+            elif method == TaxLotMethod.HIFO:
+                order = np.argsort(-lots['cb'], kind='stable')
+            else:
+                order = np.arange(lots['qty'].size)
+            orders[method] = order
+        return order
+    
     def simulate_sale(self, token: str, quantity: float, sale_price: float,
                      method: TaxLotMethod = TaxLotMethod.FIFO,
                      sale_date: Optional[datetime] = None) -> Dict:
@@ -69,67 +94,63 @@ class TaxLotSimulator:
         if sale_date is None:
             sale_date = datetime.now()
             
-        if token not in self.lots or not self.lots[token]:
+        lots = self.lots.get(token)
+        if lots is None or lots['qty'].size == 0:
             return {
                 "success": False,
                 "error": f"No lots available for {token}"
             }
         
-        available_lots = [lot for lot in self.lots[token] if lot.quantity > 0]
-        if not available_lots:
+        qty, cb, dates, ids = lots['qty'], lots['cb'], lots['date'], lots['id']
+        if not (qty > 0).any():
             return {
                 "success": False,
                 "error": f"No available quantity for {token}"
             }
         
-        # Sort lots based on method
-        if method == TaxLotMethod.FIFO:
-            available_lots.sort(key=lambda x: x.purchase_date)
-        elif method == TaxLotMethod.LIFO:
-            available_lots.sort(key=lambda x: x.purchase_date, reverse=True)
-        elif method == TaxLotMethod.HIFO:
-            available_lots.sort(key=lambda x: x.cost_basis, reverse=True)
-        
-        # Execute sale
-        remaining_quantity = quantity
-        lots_used = []
-        total_cost_basis = 0
-        
-        for lot in available_lots:
-            if remaining_quantity <= 0:
-                break
-                
-            quantity_from_lot = min(remaining_quantity, lot.quantity)
-            lots_used.append((lot, quantity_from_lot))
-            
-            total_cost_basis += quantity_from_lot * lot.cost_basis
-            remaining_quantity -= quantity_from_lot
-            
-            # Update lot quantity (for simulation only)
-            lot.quantity -= quantity_from_lot
+        # Lots in method order, skipping exhausted ones
+        order = self._lot_order(token, method)
+        order = order[qty[order] > 0]
+        
+        # Execute sale: the first lot whose running total covers the quantity is the last one used
+        cumulative = np.cumsum(qty[order])
+        k = int(np.searchsorted(cumulative, quantity))
         
-        if remaining_quantity > 0:
+        if k == cumulative.size:
             return {
                 "success": False,
-                "error": f"Insufficient quantity. Need {quantity}, have {quantity - remaining_quantity}"
+                "error": f"Insufficient quantity. Need {quantity}, have {float(cumulative[-1])}"
             }
         
+        if quantity > 0:
+            # Lots before k are consumed whole, lot k only for what is still needed
+            used = order[:k + 1]
+            qty_used = qty[used]
+            qty_used[-1] = min(quantity - (float(cumulative[k - 1]) if k > 0 else 0.0), qty_used[-1])
+        else:
+            used = order[:0]
+            qty_used = qty[used]
+        total_cost_basis = float(np.dot(qty_used, cb[used]))
+        
+        # Update lot quantities (for simulation only)
+        qty[used] -= qty_used
+        used_quantities = qty_used.tolist()
+        
         # Calculate gains/losses
         gross_proceeds = quantity * sale_price
         total_gain_loss = gross_proceeds - total_cost_basis
         
         # Categorize gains/losses by holding period
-        short_term_gain = 0
-        long_term_gain = 0
+        holding_days = (np.datetime64(sale_date, 'us') - dates[used]) // np.timedelta64(1, 'D')
+        gains = (sale_price - cb[used]) * qty_used
+        long_term = holding_days > 365
+        long_term_gain = float(gains[long_term].sum())
+        short_term_gain = float(gains[~long_term].sum())
         
-        for lot, qty_used in lots_used:
-            holding_days = (sale_date - lot.purchase_date).days
-            gain_loss = (sale_price - lot.cost_basis) * qty_used
-            
-            if holding_days > 365:  # Long-term
-                long_term_gain += gain_loss
-            else:  # Short-term
-                short_term_gain += gain_loss
+        lots_used = [
+            (TaxLot(token, float(qty[i]), float(cb[i]), dates[i].item(), ids[i]), q)
+            for i, q in zip(used.tolist(), used_quantities)
+        ]
         
         sale = Sale(
             token=token,
@@ -160,10 +181,10 @@ class TaxLotSimulator:
                     "lot_id": lot.lot_id,
                     "quantity_used": qty_used,
                     "cost_basis": lot.cost_basis,
-                    "holding_days": (sale_date - lot.purchase_date).days,
-                    "gain_loss": (sale_price - lot.cost_basis) * qty_used
+                    "holding_days": days,
+                    "gain_loss": gain
                 }
-                for lot, qty_used in lots_used
+                for (lot, qty_used), days, gain in zip(lots_used, holding_days.tolist(), gains.tolist())
             ]
         }
     
@@ -172,22 +193,24 @@ class TaxLotSimulator:
         status = {}
         
         for token, lots in self.lots.items():
-            active_lots = [lot for lot in lots if lot.quantity > 0]
+            active = lots['qty'] > 0
             
-            if not active_lots:
+            if not active.any():
                 continue
-                
-            total_quantity = sum(lot.quantity for lot in active_lots)
-            total_cost_basis = sum(lot.quantity * lot.cost_basis for lot in active_lots)
+            
+            qty = lots['qty'][active]
+            dates = lots['date'][active]
+            total_quantity = float(qty.sum())
+            total_cost_basis = float(np.dot(qty, lots['cb'][active]))
             avg_cost_basis = total_cost_basis / total_quantity if total_quantity > 0 else 0
             
             status[token] = {
                 "total_quantity": total_quantity,
                 "total_cost_basis": total_cost_basis,
                 "avg_cost_basis": avg_cost_basis,
-                "num_lots": len(active_lots),
-                "oldest_lot_date": min(lot.purchase_date for lot in active_lots).strftime('%Y-%m-%d'),
-                "newest_lot_date": max(lot.purchase_date for lot in active_lots).strftime('%Y-%m-%d')
+                "num_lots": int(active.sum()),
+                "oldest_lot_date": np.datetime_as_string(dates.min(), unit='D'),
+                "newest_lot_date": np.datetime_as_string(dates.max(), unit='D')
             }
         
         return status
@@ -203,22 +226,25 @@ class TaxLotSimulator:
         }
         
         base_date = datetime.now() - timedelta(days=365)
+        names = list(tokens)
         
-        for token, mint in tokens.items():
-            current_price = jupiter_api.get_price(mint)
-            
-            # Create 3-5 sample lots over the past year
-            for i in range(random.randint(3, 5)):
-                days_ago = random.randint(30, 365)
-                purchase_date = base_date + timedelta(days=days_ago)
-                
-                # Simulate price variations over time
-                price_variation = random.uniform(0.7, 1.3)
-                historical_price = current_price * price_variation
-                
-                quantity = random.uniform(0.5, 10) if token != 'BONK' else random.uniform(10000, 100000)
-                
-                self.add_purchase(token, quantity, historical_price, purchase_date)
+        # Per-token quotes keep get_price's CoinGecko/Kraken fallbacks; lot randomness is drawn up front
+        current_prices = np.array([jupiter_api.get_price(tokens[token]) for token in names], dtype=np.float64)
+        
+        rng = np.random.default_rng()
+        lots_per_token = rng.integers(3, 6, size=len(names))  # 3-5 lots each
+        token_idx = np.repeat(np.arange(len(names)), lots_per_token)
+        total = token_idx.size
+        
+        days_ago = rng.integers(30, 366, size=total)
+        price_variation = rng.uniform(0.7, 1.3, size=total)  # Simulate price variations over time
+        historical_prices = current_prices[token_idx] * price_variation
+        is_bonk = np.array([name == 'BONK' for name in names])[token_idx]
+        quantities = np.where(is_bonk, rng.uniform(10000, 100000, size=total), rng.uniform(0.5, 10, size=total))
+        
+        for i, days, price, quantity in zip(token_idx.tolist(), days_ago.tolist(),
+                                            historical_prices.tolist(), quantities.tolist()):
+            self.add_purchase(names[i], quantity, price, base_date + timedelta(days=days))
                 
         logging.info(f"Generated sample lots for {len(tokens)} tokens")
     
@@ -226,24 +252,19 @@ class TaxLotSimulator:
         """Compare tax implications across different lot selection methods"""
         results = {}
         
-        # Save current state
-        original_lots = {}
-        for t, lots in self.lots.items():
-            original_lots[t] = [TaxLot(lot.token, lot.quantity, lot.cost_basis, 
-                                      lot.purchase_date, lot.lot_id) for lot in lots]
+        # Save current state: sales only ever change lot quantities
+        qty_snapshot = {t: lots['qty'].copy() for t, lots in self.lots.items()}
+        sales_count = len(self.sales)
+        
+        def restore():
+            for t, lots in self.lots.items():
+                lots['qty'][:] = qty_snapshot[t]
+            del self.sales[sales_count:]
         
         for method in TaxLotMethod:
-            # Restore original state
-            self.lots = {}
-            for t, lots in original_lots.items():
-                self.lots[t] = [TaxLot(lot.token, lot.quantity, lot.cost_basis, 
-                                      lot.purchase_date, lot.lot_id) for lot in lots]
-            
             result = self.simulate_sale(token, quantity, sale_price, method)
+            restore()
             if result["success"]:
                 results[method.value] = result["sale_summary"]
         
-        # Restore final state
-        self.lots = original_lots
-        
         return results
\ No newline at end of file
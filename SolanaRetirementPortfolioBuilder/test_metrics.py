@@ -0,0 +1,32 @@
+import unittest
+from unittest import mock
+
+import metrics
+from metrics import MetricsCalculator
+
+
+class PortfolioMetricsShortHistoryTest(unittest.TestCase):
+    """A 2-point NAV history yields one return, too few for a regression"""
+
+    nav_history = [{'nav': 10000.0}, {'nav': 10100.0}]
+    benchmark_history = {'SOL': [{'nav': 150.0}, {'nav': 148.0}]}
+
+    def _metrics(self) -> dict:
+        return MetricsCalculator().calculate_portfolio_metrics(self.nav_history, self.benchmark_history, [])
+
+    def _assert_neutral_beta_alpha(self, result: dict):
+        self.assertEqual(result['beta_sol'], 1.0)
+        self.assertEqual(result['alpha_sol'], 0.0)
+
+    def test_numpy_path(self):
+        with mock.patch.object(metrics, 'numba', None):
+            self._assert_neutral_beta_alpha(self._metrics())
+
+    def test_kernel_path(self):
+        # Any non-None module selects the kernel branch; without numba it runs as plain Python
+        with mock.patch.object(metrics, 'numba', metrics.numba or object()):
+            self._assert_neutral_beta_alpha(self._metrics())
+
+
+if __name__ == '__main__':
+    unittest.main()